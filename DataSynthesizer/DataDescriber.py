@@ -1,10 +1,12 @@
 import json
+import random
+from math import prod
 from typing import Dict, List, Union
 
-from numpy import array_equal
-from pandas import DataFrame, read_csv
+from numpy import array_equal, ndarray, random as np_random
+from pandas import DataFrame, Series, read_csv
 
-from datatypes.AbstractAttribute import AbstractAttribute
+from datatypes.AbstractAttribute import AbstractAttribute, encode_values_into_bin_idx
 from datatypes.DateTimeAttribute import is_datetime, DateTimeAttribute
 from datatypes.FloatAttribute import FloatAttribute
 from datatypes.IntegerAttribute import IntegerAttribute
@@ -12,7 +14,12 @@ from datatypes.SocialSecurityNumberAttribute import is_ssn, SocialSecurityNumber
 from datatypes.StringAttribute import StringAttribute
 from datatypes.utils.DataType import DataType
 from lib import utils
-from lib.PrivBayes import greedy_bayes, construct_noisy_conditional_distributions
+from lib.PrivBayes import (greedy_bayes, construct_noisy_conditional_tensors, conditional_tensors_to_distributions,
+                           calculate_k, MutualInformationCache, mutual_information_estimation_error,
+                           structure_learning_sample_size, bayesian_network_drift, greedy_bayes_workload,
+                           calibrate_entropy_kernel, entropy_kernel_elements, conditional_table_attributes,
+                           construct_noisy_conditional_tensors_from_counts, ELEMENTS_PER_NOISY_CELL)
+from lib.sharding import count_tables_in_shards
 
 
 class DataDescriber:
@@ -42,8 +49,23 @@ class DataDescriber:
         Dictionary of {attribute: AbstractAttribute}
     bayesian_network : list
         List of [child, [parent,]] to represent a Bayesian Network.
+    conditional_tensors : dict
+        Dictionary of {attribute: ndarray}. Distribution of the root, and conditional distribution tables of the other
+        attributes in Bayesian network, with one axis per parent followed by one axis for the attribute itself.
+        In sparse mode, the tables are SparseConditionalDistribution instead.
     df_encoded : DataFrame
         Input dataset encoded into integers, taken as input by PrivBayes algorithm in correlated attribute mode.
+        When conditional tables are counted in shards, only the rows sampled for structure learning.
+    mi_cache : MutualInformationCache
+        Mutual information scores computed during Bayesian network construction, with hit/miss counters.
+    structure_learning_sample : dict
+        Number of rows the Bayesian network was learned from, and the estimated error of its mutual information scores.
+    network_drift : list
+        In refit mode, the children of the reused Bayesian network whose parents no longer look optimal, with the
+        mutual information of their parents and of better alternatives.
+    coarsened_domains : list
+        Attributes whose domains were coarsened to fit max_conditional_table_cells, with their original and new
+        numbers of bins, and the categories folded into "other".
     """
 
     def __init__(self, histogram_bins: Union[int, str] = 20, category_threshold=10, null_values=None):
@@ -59,7 +81,12 @@ class DataDescriber:
         self.df_input: DataFrame = None
         self.attr_to_column: Dict[str, AbstractAttribute] = None
         self.bayesian_network: List = None
+        self.conditional_tensors: Dict[str, ndarray] = None
         self.df_encoded: DataFrame = None
+        self.mi_cache: MutualInformationCache = None
+        self.structure_learning_sample: Dict = None
+        self.network_drift: List[Dict] = None
+        self.coarsened_domains: List[Dict] = None
 
     def describe_dataset_in_random_mode(self,
                                         dataset_file: str,
@@ -137,7 +164,20 @@ class DataDescriber:
                                                       attribute_to_is_candidate_key: Dict[str, bool] = None,
                                                       categorical_attribute_domain_file: str = None,
                                                       numerical_attribute_ranges: Dict[str, List] = None,
-                                                      seed=0):
+                                                      seed=0,
+                                                      structure_learning_error: float = None,
+                                                      max_candidate_parents: int = None,
+                                                      candidate_fraction: float = None,
+                                                      save_conditional_tensors: bool = False,
+                                                      sparse_conditional_tensors: bool = False,
+                                                      checkpoint_file: str = None,
+                                                      resume_file: str = None,
+                                                      previous_description_file: str = None,
+                                                      drift_tolerance=0.05,
+                                                      execution_mode: str = None,
+                                                      max_workers: int = None,
+                                                      max_conditional_table_cells: int = None,
+                                                      num_shards: int = None):
         """Generate dataset description using correlated attribute mode.
 
         Parameters
@@ -161,7 +201,59 @@ class DataDescriber:
             Dictionary of {attribute: [min, max]}, e.g., {"age": [25, 65]}
         seed : int or float
             Seed the random number generator.
+        structure_learning_error : float
+            If set, learn the Bayesian network from a stratified sample of rows, sized so that the estimated error of
+            mutual information scores is at most this value (in nats). The error is the Miller-Madow estimate of the
+            bias of plug-in scores, not a bound. If the dataset is too small to meet it, all rows are used and a
+            warning is printed. Conditional distributions still use all rows.
+        max_candidate_parents : int
+            Approximate mode for wide datasets. Parents of each attribute are only chosen among this many attributes
+            with the highest pairwise mutual information with it.
+        candidate_fraction : float
+            Stochastic greedy mode. Each iteration of Bayesian network construction only scores a random subset of this
+            fraction of the candidates.
+        save_conditional_tensors : bool
+            Also record the conditional distribution tables as nested lists under "conditional_probability_tensors".
+            They are cheaper to save and to sample from than "conditional_probabilities".
+        sparse_conditional_tensors : bool
+            Only store the parent instances of each conditional distribution whose noisy counts exceed a threshold
+            (the observed ones if epsilon is 0), instead of the full product of parent domains. Empty cells pass the
+            threshold as often as their noise would, so the stored instances do not reveal the support of the data.
+            The other parent instances fall back to the marginal distribution of the attribute.
+        checkpoint_file : str
+            Save the partial Bayesian network to this file after every iteration of its construction.
+        resume_file : str
+            Continue Bayesian network construction from a checkpoint file written with the same input and parameters.
+        previous_description_file : str
+            Refit mode. Reuse the Bayesian network of this description, e.g. of an earlier extract with the same schema,
+            instead of learning one. Only the histograms and the conditional distributions are computed on the new
+            dataset, and k is taken from the reused network. The network is checked for drift, see network_drift.
+        drift_tolerance : float
+            A child of the reused network has drifted if parents chosen among the attributes added before it explain it
+            more than (1 + drift_tolerance) times better than its own parents.
+        execution_mode : str
+            By default, each step of PrivBayes runs serially or in worker processes depending on its estimated cost.
+            Set to 'serial' or 'process' to override.
+        max_workers : int
+            Maximum number of worker processes. Defaults to the number of CPUs.
+        max_conditional_table_cells : int
+            Budget of cells per conditional distribution table. Attribute domains are coarsened until any k parents
+            and child fit into it, see fit_domains_to_cell_budget. What was merged is recorded in coarsened_domains.
+        num_shards : int
+            If set, the contingency tables of conditional distributions are counted by worker processes that each read
+            and encode one of num_shards byte ranges of dataset_file, and summed before noise is injected. The result is
+            the same as counting the encoded dataset. Requires structure_learning_error: the full encoded dataset is
+            never built, only the rows sampled for structure learning (or for the drift check in refit mode) are
+            encoded in memory. Only dense tables are supported.
         """
+        if save_conditional_tensors and sparse_conditional_tensors:
+            raise Exception('Conditional tensors can only be saved in the description when they are dense.')
+        if num_shards and sparse_conditional_tensors:
+            raise Exception('Conditional tensors can only be counted in shards when they are dense.')
+        if num_shards and not structure_learning_error:
+            raise Exception('Counting conditional tables in shards requires structure_learning_error, so that only a '
+                            'sample of the dataset is encoded for Bayesian network construction.')
+
         self.describe_dataset_in_independent_attribute_mode(dataset_file,
                                                             epsilon,
                                                             attribute_to_datatype,
@@ -170,14 +262,215 @@ class DataDescriber:
                                                             categorical_attribute_domain_file,
                                                             numerical_attribute_ranges,
                                                             seed)
+        num_tuples = self.data_description['meta']['num_tuples']
+        num_attributes_in_BN = self.data_description['meta']['num_attributes_in_BN']
+        if num_attributes_in_BN < 2:
+            raise Exception("Correlated Attribute Mode requires at least 2 attributes/columns in dataset.")
+        if previous_description_file:
+            k = len(utils.read_json_file(previous_description_file)['bayesian_network'][-1][1])
+        elif not k:
+            k = calculate_k(num_attributes_in_BN, num_tuples)
+        if max_conditional_table_cells:
+            self.fit_domains_to_cell_budget(k, max_conditional_table_cells, epsilon)
+
+        self.mi_cache = MutualInformationCache()
+        if num_shards:
+            # Only the sampled rows are encoded in memory. Conditional tables are counted from the shards instead.
+            self.df_encoded = None
+            self.df_encoded = self.sample_rows_for_structure_learning(k, structure_learning_error)
+            df_structure = self.df_encoded
+        else:
+            self.df_encoded = self.encode_dataset_into_binning_indices()
+            if structure_learning_error and not previous_description_file:
+                df_structure = self.sample_rows_for_structure_learning(k, structure_learning_error)
+            else:
+                df_structure = self.df_encoded
+
+        if previous_description_file:
+            self.bayesian_network = self.reuse_bayesian_network(previous_description_file, drift_tolerance, epsilon,
+                                                                execution_mode, max_workers)
+        else:
+            self.bayesian_network = greedy_bayes(df_structure, k, epsilon, self.mi_cache, max_candidate_parents,
+                                                 candidate_fraction, checkpoint_file, resume_file=resume_file,
+                                                 execution_mode=execution_mode, max_workers=max_workers)
+        self.data_description['bayesian_network'] = self.bayesian_network
+        if num_shards:
+            counts = self.count_conditional_tables_in_shards(dataset_file, num_shards, max_workers)
+            self.conditional_tensors = construct_noisy_conditional_tensors_from_counts(
+                self.bayesian_network, counts, num_tuples, epsilon, seed)
+        else:
+            self.conditional_tensors = construct_noisy_conditional_tensors(self.bayesian_network, self.df_encoded,
+                                                                           epsilon, seed, sparse_conditional_tensors,
+                                                                           execution_mode=execution_mode,
+                                                                           max_workers=max_workers)
+        self.data_description['conditional_probabilities'] = conditional_tensors_to_distributions(
+            self.conditional_tensors, self.bayesian_network)
+        if save_conditional_tensors:
+            self.data_description['conditional_probability_tensors'] = {
+                attr: tensor.tolist() for attr, tensor in self.conditional_tensors.items()}
+
+    def describe_dataset_in_correlated_attribute_mode_sweep(self,
+                                                            dataset_file,
+                                                            ks: List[int] = (0,),
+                                                            epsilons: List[float] = (0.1,),
+                                                            attribute_to_datatype: Dict[str, DataType] = None,
+                                                            attribute_to_is_categorical: Dict[str, bool] = None,
+                                                            attribute_to_is_candidate_key: Dict[str, bool] = None,
+                                                            categorical_attribute_domain_file: str = None,
+                                                            numerical_attribute_ranges: Dict[str, List] = None,
+                                                            seed=0,
+                                                            max_candidate_parents: int = None,
+                                                            candidate_fraction: float = None,
+                                                            sparse_conditional_tensors: bool = False,
+                                                            execution_mode: str = None,
+                                                            max_workers: int = None):
+        """Generate one dataset description in correlated attribute mode per setting of k and epsilon.
+
+        The dataset is read and encoded once. Mutual information scores and contingency tables do not depend on
+        epsilon, so they are computed once and shared by all settings; each setting only repeats the exponential
+        mechanism and the Laplace noise. Each description is identical to the one
+        describe_dataset_in_correlated_attribute_mode would produce with the same parameters and seed.
+
+        Parameters
+        ----------
+        ks : list of int
+            Values of k. A value of 0 is replaced by the automatically calculated k.
+        epsilons : list of float
+            Values of epsilon.
+
+        See describe_dataset_in_correlated_attribute_mode for the other parameters.
+
+        Returns
+        -------
+        dict
+            Dictionary of {(k, epsilon): data_description}. The describer itself is left in the state of the last
+            setting.
+        """
+        self.describe_dataset_in_random_mode(dataset_file,
+                                             attribute_to_datatype,
+                                             attribute_to_is_categorical,
+                                             attribute_to_is_candidate_key,
+                                             categorical_attribute_domain_file,
+                                             numerical_attribute_ranges,
+                                             seed=seed)
+        for column in self.attr_to_column.values():
+            column.infer_distribution()
+        noise_free_distributions = {attr: column.distribution_probabilities
+                                    for attr, column in self.attr_to_column.items()}
+        # Every setting starts from the random state a single run would have at this point.
+        random_state, numpy_random_state = random.getstate(), np_random.get_state()
+
         self.df_encoded = self.encode_dataset_into_binning_indices()
         if self.df_encoded.shape[1] < 2:
             raise Exception("Correlated Attribute Mode requires at least 2 attributes/columns in dataset.")
 
-        self.bayesian_network = greedy_bayes(self.df_encoded, k, epsilon)
-        self.data_description['bayesian_network'] = self.bayesian_network
-        self.data_description['conditional_probabilities'] = construct_noisy_conditional_distributions(
-            self.bayesian_network, self.df_encoded, epsilon)
+        self.mi_cache = MutualInformationCache()
+        count_cache = {}
+        descriptions = {}
+        for k in ks:
+            if not k:
+                k = calculate_k(self.df_encoded.shape[1], self.df_encoded.shape[0])
+            for epsilon in epsilons:
+                random.setstate(random_state)
+                np_random.set_state(numpy_random_state)
+                for attr, column in self.attr_to_column.items():
+                    column.distribution_probabilities = noise_free_distributions[attr]
+                self.inject_laplace_noise_into_distribution_per_attribute(epsilon)
+                self.data_description['attribute_description'] = {}
+                for attr, column in self.attr_to_column.items():
+                    self.data_description['attribute_description'][attr] = column.to_json()
+
+                self.bayesian_network = greedy_bayes(self.df_encoded, k, epsilon, self.mi_cache,
+                                                     max_candidate_parents, candidate_fraction,
+                                                     execution_mode=execution_mode, max_workers=max_workers)
+                self.data_description['bayesian_network'] = self.bayesian_network
+                self.conditional_tensors = construct_noisy_conditional_tensors(self.bayesian_network, self.df_encoded,
+                                                                               epsilon, seed,
+                                                                               sparse_conditional_tensors, count_cache)
+                self.data_description['conditional_probabilities'] = conditional_tensors_to_distributions(
+                    self.conditional_tensors, self.bayesian_network)
+                # Every entry but the meta is rebuilt above, so a shallow copy does not share them across settings.
+                descriptions[(k, epsilon)] = {**self.data_description, 'meta': dict(self.data_description['meta'])}
+        print(f'Contingency tables counted: {len(count_cache)}.')
+        return descriptions
+
+    def plan_correlated_attribute_mode(self,
+                                       dataset_file,
+                                       k=0,
+                                       epsilon=0.1,
+                                       attribute_to_datatype: Dict[str, DataType] = None,
+                                       attribute_to_is_categorical: Dict[str, bool] = None,
+                                       attribute_to_is_candidate_key: Dict[str, bool] = None,
+                                       categorical_attribute_domain_file: str = None,
+                                       numerical_attribute_ranges: Dict[str, List] = None):
+        """Predict the cost of describe_dataset_in_correlated_attribute_mode with the same parameters, without running
+        it.
+
+        Only the schema and the domain size of every attribute are inferred. The Bayesian network is unknown before it
+        is learned, so conditional distribution tables are sized for the worst case: the child with the parents of the
+        largest domains. Times are extrapolated from a calibration of the entropy kernel on this machine, for a single
+        worker.
+
+        Returns
+        -------
+        dict
+            Dictionary of {'k', 'num_tuples', 'domain_sizes', 'greedy_bayes_iterations', 'full_space_cells',
+            'conditional_table_cells', 'conditional_table_peak_bytes', 'seconds_per_element', 'estimated_seconds'}.
+            See greedy_bayes_workload for the iterations. Peak bytes count the float64 table and its noise.
+        """
+        self.describe_dataset_in_random_mode(dataset_file,
+                                             attribute_to_datatype,
+                                             attribute_to_is_categorical,
+                                             attribute_to_is_candidate_key,
+                                             categorical_attribute_domain_file,
+                                             numerical_attribute_ranges)
+        attributes = self.data_description['meta']['attributes_in_BN']
+        num_tuples = self.data_description['meta']['num_tuples']
+        domain_sizes = {}
+        for attr in attributes:
+            column = self.attr_to_column[attr]
+            column.infer_distribution()
+            domain_sizes[attr] = len(column.distribution_bins) + int(column.missing_rate > 0)
+        if not k:
+            k = calculate_k(len(attributes), num_tuples)
+
+        workload = greedy_bayes_workload(len(attributes), k, epsilon)
+        largest = sorted(domain_sizes.values(), reverse=True)
+        full_space_cells = prod(largest[:k + 1])
+        table_cells = {}
+        for attr in attributes:
+            parents_sizes = sorted(domain_sizes.values(), reverse=True)
+            parents_sizes.remove(domain_sizes[attr])
+            table_cells[attr] = domain_sizes[attr] * prod(parents_sizes[:k])
+
+        seconds_per_element = calibrate_entropy_kernel(num_tuples, largest[:k + 1])
+        greedy_bayes_elements = sum(iteration['entropy_evaluations']
+                                    * entropy_kernel_elements(num_tuples, largest[:iteration['attributes_per_entropy']])
+                                    for iteration in workload)
+        conditional_tables_elements = (len(attributes) * (k + 1) * num_tuples
+                                       + ELEMENTS_PER_NOISY_CELL * sum(table_cells.values()))
+        estimated_seconds = {'greedy_bayes': greedy_bayes_elements * seconds_per_element,
+                             'conditional_tables': conditional_tables_elements * seconds_per_element}
+
+        print(f'k = {k}, {len(attributes)} attributes in BN, {num_tuples} tuples.')
+        print(f'greedy_bayes: {len(workload)} iterations, at most {max(it["candidates"] for it in workload)} '
+              f'candidates and {max(it["mi_evaluations"] for it in workload)} new mutual information scores per '
+              f'iteration.')
+        print(f'Largest full_space table: {full_space_cells} cells.')
+        for attr in sorted(attributes, key=lambda attr: table_cells[attr], reverse=True):
+            print(f'    {attr}: at most {table_cells[attr]} cells, {16 * table_cells[attr] / 2 ** 20:.3g} MiB peak.')
+        print(f'Estimated time: {estimated_seconds["greedy_bayes"]:.3g} s for greedy_bayes, '
+              f'{estimated_seconds["conditional_tables"]:.3g} s for conditional distributions.')
+
+        return {'k': k,
+                'num_tuples': num_tuples,
+                'domain_sizes': domain_sizes,
+                'greedy_bayes_iterations': workload,
+                'full_space_cells': full_space_cells,
+                'conditional_table_cells': table_cells,
+                'conditional_table_peak_bytes': {attr: 16 * cells for attr, cells in table_cells.items()},
+                'seconds_per_element': seconds_per_element,
+                'estimated_seconds': estimated_seconds}
 
     def read_dataset_from_csv(self, file_name=None):
         try:
@@ -287,13 +580,158 @@ class DataDescriber:
             assert isinstance(column, AbstractAttribute)
             column.inject_laplace_noise(epsilon, num_attributes_in_BN)
 
-    def encode_dataset_into_binning_indices(self):
-        """Before constructing Bayesian network, encode input dataset into binning indices."""
+    def fit_domains_to_cell_budget(self, k, max_cells, epsilon=0.1):
+        """Coarsen the domains of attributes in the Bayesian network, so that the conditional distribution table of any
+        child with k parents has at most max_cells cells, whatever the network.
+
+        The attribute with the largest domain is coarsened first, and never below the next largest one, so the budget
+        is spread over the largest domains. See AbstractAttribute.coarsen_domain. The coarsened attributes get new
+        noisy distributions. Since the choice of bins depends on observed frequencies, it is not differentially
+        private.
+        """
+        attributes = self.data_description['meta']['attributes_in_BN']
+        missing = {attr: int(self.attr_to_column[attr].missing_rate > 0) for attr in attributes}
+        # Number of binning indices, including the index of missing values.
+        domain_sizes = {attr: len(self.attr_to_column[attr].distribution_bins) + missing[attr] for attr in attributes}
+        initial_sizes = dict(domain_sizes)
+        while True:
+            largest = sorted(attributes, key=lambda attr: domain_sizes[attr], reverse=True)[:k + 1]
+            cells = prod([domain_sizes[attr] for attr in largest])
+            if cells <= max_cells:
+                break
+            attr = largest[0]
+            fitting_size = max_cells // (cells // domain_sizes[attr])
+            next_size = domain_sizes[largest[1]] if len(largest) > 1 else 0
+            size = min(max(fitting_size, next_size), domain_sizes[attr] - 1)
+            if size < 2 + missing[attr]:
+                raise Exception(f'Conditional distribution tables of {k} parents cannot fit into {max_cells} cells.')
+            domain_sizes[attr] = size
+
+        self.coarsened_domains = []
+        num_attributes_in_BN = self.data_description['meta']['num_attributes_in_BN']
+        for attr in attributes:
+            if domain_sizes[attr] == initial_sizes[attr]:
+                continue
+            column = self.attr_to_column[attr]
+            num_bins = domain_sizes[attr] - missing[attr]
+            folded = column.coarsen_domain(num_bins)
+            column.infer_distribution()
+            column.inject_laplace_noise(epsilon, num_attributes_in_BN)
+            self.attr_to_is_categorical[attr] = column.is_categorical
+            self.data_description['attribute_description'][attr] = column.to_json()
+            self.coarsened_domains.append({'attribute': attr,
+                                           'original_bins': initial_sizes[attr] - missing[attr],
+                                           'bins': num_bins,
+                                           'folded_categories': folded})
+            if folded is None:
+                print(f'Coarsening {attr} from {initial_sizes[attr] - missing[attr]} into {num_bins} bins.')
+            else:
+                print(f'Folding {len(folded)} rare categories of {attr} into "other": {folded}')
+        return self.coarsened_domains
+
+    def count_conditional_tables_in_shards(self, dataset_file, num_shards, max_workers: int = None):
+        """Count the contingency tables of the conditional distributions of the Bayesian network by a map-reduce pass
+        over byte-range shards of dataset_file. Every shard is encoded with the bins of the attribute descriptions.
+
+        Columns of every shard are read with their dtypes in df_input, instead of dtypes inferred from the shard alone,
+        e.g. int64 for a shard whose String values all look like numbers.
+        """
+        tables = [tuple(table) for table in conditional_table_attributes(self.bayesian_network)]
+        bin_definitions = {attr: (type(column), column.is_categorical, column.distribution_bins)
+                           for attr, column in self.attr_to_column.items()
+                           if attr in self.data_description['meta']['attributes_in_BN']}
+        dtypes = {attr: self.df_input[attr].dtype for attr in bin_definitions}
+        try:
+            num_tuples, counts = count_tables_in_shards(dataset_file, tables, bin_definitions, num_shards, max_workers,
+                                                        skipinitialspace=True, na_values=self.null_values,
+                                                        dtype=dtypes)
+        except UnicodeDecodeError:
+            num_tuples, counts = count_tables_in_shards(dataset_file, tables, bin_definitions, num_shards, max_workers,
+                                                        skipinitialspace=True, na_values=self.null_values,
+                                                        dtype=dtypes, encoding='latin1')
+        expected_num_tuples = self.data_description['meta']['num_tuples']
+        if num_tuples != expected_num_tuples:
+            raise Exception(f'Shards of {dataset_file} have {num_tuples} rows instead of {expected_num_tuples}. '
+                            f'Fields with line breaks are not supported.')
+        return counts
+
+    def encode_dataset_into_binning_indices(self, rows=None):
+        """Before constructing Bayesian network, encode input dataset into binning indices.
+
+        Every column keeps the smallest unsigned integer dtype that holds its indices. If rows is given, only the rows
+        at these positions are encoded.
+        """
         encoded_dataset = DataFrame()
         for attr in self.data_description['meta']['attributes_in_BN']:
-            encoded_dataset[attr] = self.attr_to_column[attr].encode_values_into_bin_idx()
+            column = self.attr_to_column[attr]
+            if rows is None:
+                encoded_dataset[attr] = column.encode_values_into_bin_idx()
+            else:
+                encoded_dataset[attr] = encode_values_into_bin_idx(column.data.iloc[rows], column.is_categorical,
+                                                                   column.distribution_bins)
         return encoded_dataset
 
+    def sample_rows_for_structure_learning(self, k, target_error):
+        """Sample encoded rows for Bayesian network construction.
+
+        The sample is stratified on the attribute with the largest domain, whose rare values are the most likely to be
+        lost by uniform sampling. If df_encoded is None, as when conditional tables are counted in shards, the columns
+        are encoded one at a time to find the cardinalities, and only the sampled rows are kept. The sample is the same
+        as from df_encoded.
+
+        The reported estimated_error is the Miller-Madow estimate of the bias of mutual information scores, see
+        mutual_information_estimation_error, not a bound on their error.
+        """
+        num_tuples = self.data_description['meta']['num_tuples']
+        if self.df_encoded is None:
+            attributes = self.data_description['meta']['attributes_in_BN']
+            cardinalities = Series({attr: int(self.attr_to_column[attr].encode_values_into_bin_idx().max()) + 1
+                                    for attr in attributes})
+            strata = self.attr_to_column[cardinalities.idxmax()].encode_values_into_bin_idx().values.astype(int)
+        else:
+            cardinalities = self.df_encoded.max().astype(int) + 1
+            strata = self.df_encoded[cardinalities.idxmax()].values.astype(int)
+        required_sample_size = structure_learning_sample_size(cardinalities.tolist(), k, target_error)
+        sample_size = min(required_sample_size, num_tuples)
+        rows = utils.stratified_sample_indices(strata, sample_size)
+        if self.df_encoded is None:
+            df_sample = self.encode_dataset_into_binning_indices(rows)
+        else:
+            df_sample = self.df_encoded.iloc[rows]
+
+        estimated_error = mutual_information_estimation_error(cardinalities.tolist(), k, df_sample.shape[0])
+        self.structure_learning_sample = {'sample_size': df_sample.shape[0], 'estimated_error': estimated_error}
+        print(f'Learning Bayesian network from {df_sample.shape[0]} of {num_tuples} rows, '
+              f'estimated mutual information error {estimated_error:.4g} nats.')
+        if required_sample_size > num_tuples:
+            print(f'Warning: the target mutual information error of {target_error:.4g} nats needs '
+                  f'{required_sample_size} rows, more than the dataset has. All rows are used.')
+        return df_sample
+
+    def reuse_bayesian_network(self, previous_description_file, drift_tolerance=0.05, epsilon=0.1,
+                               execution_mode: str = None, max_workers: int = None):
+        """Load the Bayesian network of a previous description and check it for drift on the encoded dataset."""
+        bayesian_network = [(child, parents) for child, parents in
+                            utils.read_json_file(previous_description_file)['bayesian_network']]
+        network_attributes = [bayesian_network[0][1][0]] + [child for child, _ in bayesian_network]
+        if sorted(network_attributes) != sorted(self.df_encoded.columns):
+            raise Exception(f'The Bayesian network in {previous_description_file} does not cover the same attributes '
+                            f'as the dataset.')
+        print(f'Reusing the Bayesian network in {previous_description_file}.')
+
+        if epsilon:
+            print('Warning: checking the reused Bayesian network by noise-free mutual information is not '
+                  'differentially private.')
+        self.network_drift = bayesian_network_drift(self.df_encoded, bayesian_network, self.mi_cache, drift_tolerance,
+                                                    execution_mode, max_workers)
+        for drift in self.network_drift:
+            print(f'Warning: the parents {drift["parents"]} of {drift["attribute"]} may be outdated. Mutual '
+                  f'information is {drift["mutual_information"]:.4g} nats with them, '
+                  f'{drift["alternative_mutual_information"]:.4g} with {drift["alternative_parents"]}.')
+        if self.network_drift:
+            print(f'{len(self.network_drift)} attributes have drifted. Consider learning a new Bayesian network.')
+        return bayesian_network
+
     def save_dataset_description_to_file(self, file_name):
         with open(file_name, 'w') as outfile:
             json.dump(self.data_description, outfile, indent=4)
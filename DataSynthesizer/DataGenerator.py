@@ -1,20 +1,28 @@
 import numpy as np
 import pandas as pd
 
-from datatypes.utils.AttributeLoader import parse_json
-from lib.utils import set_random_seed, read_json_file, generate_random_string
+from lib.sampling import SamplingPlan, load_sampling_plan
+from lib.utils import set_random_seed, generate_random_strings
 
 
 class DataGenerator(object):
+    """Generate synthetic datasets from dataset descriptions.
+
+    Every generate_dataset_in_* method takes either the path of a description file, whose compiled SamplingPlan is
+    cached by path and modification time, or a SamplingPlan compiled beforehand.
+    """
+
     def __init__(self):
         self.n = 0
         self.synthetic_dataset = None
         self.description = {}
         self.encoded_dataset = None
 
-    def generate_dataset_in_random_mode(self, n, description_file, seed=0, minimum=0, maximum=100):
+    def generate_dataset_in_random_mode(self, n, description_file, seed=0, minimum=0, maximum=100,
+                                        plan: SamplingPlan = None):
         set_random_seed(seed)
-        description = read_json_file(description_file)
+        plan = plan or load_sampling_plan(description_file)
+        description = plan.description
 
         self.synthetic_dataset = pd.DataFrame()
         for attr in description['attribute_description'].keys():
@@ -23,48 +31,47 @@ class DataGenerator(object):
             is_categorical = attr_info['is_categorical']
             is_candidate_key = attr_info['is_candidate_key']
             if is_candidate_key:
-                self.synthetic_dataset[attr] = parse_json(attr_info).generate_values_as_candidate_key(n)
+                self.synthetic_dataset[attr] = plan.columns[attr].generate_values_as_candidate_key(n)
             elif is_categorical:
                 self.synthetic_dataset[attr] = np.random.choice(attr_info['distribution_bins'], n)
             elif datatype == 'String':
                 length = np.random.randint(attr_info['min'], attr_info['max'])
-                self.synthetic_dataset[attr] = length
-                self.synthetic_dataset[attr] = self.synthetic_dataset[attr].map(lambda x: generate_random_string(x))
+                self.synthetic_dataset[attr] = generate_random_strings(np.full(n, length))
             else:
                 if datatype == 'Integer':
                     self.synthetic_dataset[attr] = np.random.randint(minimum, maximum + 1, n)
                 else:
                     self.synthetic_dataset[attr] = np.random.uniform(minimum, maximum, n)
 
-    def generate_dataset_in_independent_mode(self, n, description_file, seed=0):
+    def generate_dataset_in_independent_mode(self, n, description_file, seed=0, plan: SamplingPlan = None):
         set_random_seed(seed)
-        self.description = read_json_file(description_file)
+        plan = plan or load_sampling_plan(description_file)
+        self.description = plan.description
 
         all_attributes = self.description['meta']['all_attributes']
         candidate_keys = set(self.description['meta']['candidate_keys'])
         self.synthetic_dataset = pd.DataFrame(columns=all_attributes)
         for attr in all_attributes:
-            attr_info = self.description['attribute_description'][attr]
-            column = parse_json(attr_info)
+            column = plan.columns[attr]
 
             if attr in candidate_keys:
                 self.synthetic_dataset[attr] = column.generate_values_as_candidate_key(n)
             else:
-                binning_indices = column.sample_binning_indices_in_independent_attribute_mode(n)
+                binning_indices = plan.sample_binning_indices(attr, n)
                 self.synthetic_dataset[attr] = column.sample_values_from_binning_indices(binning_indices)
 
-    def generate_dataset_in_correlated_attribute_mode(self, n, description_file, seed=0):
+    def generate_dataset_in_correlated_attribute_mode(self, n, description_file, seed=0, plan: SamplingPlan = None):
         set_random_seed(seed)
         self.n = n
-        self.description = read_json_file(description_file)
+        plan = plan or load_sampling_plan(description_file)
+        self.description = plan.description
 
         all_attributes = self.description['meta']['all_attributes']
         candidate_keys = set(self.description['meta']['candidate_keys'])
-        self.encoded_dataset = DataGenerator.generate_encoded_dataset(self.n, self.description)
+        self.encoded_dataset = plan.sample_encoded_dataset(self.n)
         self.synthetic_dataset = pd.DataFrame(columns=all_attributes)
         for attr in all_attributes:
-            attr_info = self.description['attribute_description'][attr]
-            column = parse_json(attr_info)
+            column = plan.columns[attr]
 
             if attr in self.encoded_dataset:
                 self.synthetic_dataset[attr] = column.sample_values_from_binning_indices(self.encoded_dataset[attr])
@@ -72,7 +79,7 @@ class DataGenerator(object):
                 self.synthetic_dataset[attr] = column.generate_values_as_candidate_key(n)
             else:
                 # for attributes not in BN or candidate keys, use independent attribute mode.
-                binning_indices = column.sample_binning_indices_in_independent_attribute_mode(n)
+                binning_indices = plan.sample_binning_indices(attr, n)
                 self.synthetic_dataset[attr] = column.sample_values_from_binning_indices(binning_indices)
 
     @staticmethod
@@ -84,34 +91,11 @@ class DataGenerator(object):
 
     @staticmethod
     def generate_encoded_dataset(n, description):
-        bn = description['bayesian_network']
-        bn_root_attr = bn[0][1][0]
-        root_attr_dist = description['conditional_probabilities'][bn_root_attr]
-        encoded_df = pd.DataFrame(columns=DataGenerator.get_sampling_order(bn))
-        encoded_df[bn_root_attr] = np.random.choice(len(root_attr_dist), size=n, p=root_attr_dist)
-
-        for child, parents in bn:
-            child_conditional_distributions = description['conditional_probabilities'][child]
-            for parents_instance in child_conditional_distributions.keys():
-                dist = child_conditional_distributions[parents_instance]
-                parents_instance = list(eval(parents_instance))
-
-                filter_condition = ''
-                for parent, value in zip(parents, parents_instance):
-                    filter_condition += f"(encoded_df['{parent}']=={value})&"
-
-                filter_condition = eval(filter_condition[:-1])
-
-                size = encoded_df[filter_condition].shape[0]
-                if size:
-                    encoded_df.loc[filter_condition, child] = np.random.choice(len(dist), size=size, p=dist)
-
-            unconditioned_distribution = description['attribute_description'][child]['distribution_probabilities']
-            encoded_df.loc[encoded_df[child].isnull(), child] = np.random.choice(len(unconditioned_distribution),
-                                                                                 size=encoded_df[child].isnull().sum(),
-                                                                                 p=unconditioned_distribution)
-        encoded_df[encoded_df.columns] = encoded_df[encoded_df.columns].astype(int)
-        return encoded_df
+        """Sample binning indices of the attributes in the Bayesian network, in the order of the network.
+
+        The description is compiled into a SamplingPlan for this call only; keep the plan to sample it repeatedly.
+        """
+        return SamplingPlan(description).sample_encoded_dataset(n)
 
     def save_synthetic_data(self, to_file):
         self.synthetic_dataset.to_csv(to_file, index=False)
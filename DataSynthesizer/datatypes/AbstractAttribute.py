@@ -1,16 +1,53 @@
 from abc import ABCMeta, abstractmethod
-from bisect import bisect_right
-from random import uniform
 from typing import List, Union
 
 import numpy as np
 from numpy.random import choice
 from pandas import Series
 
-from datatypes.utils import DataType
+from datatypes.utils.DataType import DataType
 from lib import utils
 
 
+def encode_values_into_bin_idx(values: Series, is_categorical, distribution_bins):
+    """Encode values into bin indices, in the smallest unsigned integer dtype that holds them.
+
+    Missing values are encoded as len(distribution_bins). Categorical values that are not in the bins are also looked
+    up as strings, then fall into the "other" category if there is one, so that raw values of an attribute whose
+    domain was coarsened are encoded as its data was. Numerical values out of the range of the bins, e.g. of a range
+    set by the user, fall into the first or the last bin.
+    """
+    num_bins = len(distribution_bins)
+    present = values.notnull()
+    if is_categorical:
+        value_to_bin_idx = {value: idx for idx, value in enumerate(distribution_bins)}
+        encoded = values.map(value_to_bin_idx)
+        unknown = present & encoded.isnull()
+        if unknown.any():
+            encoded.loc[unknown] = values[unknown].map(str).map(value_to_bin_idx)
+            unknown = present & encoded.isnull()
+        if unknown.any():
+            if 'other' not in value_to_bin_idx:
+                raise Exception(f'Values {values[unknown].unique()[:5].tolist()} are not in the domain of '
+                                f'{values.name}.')
+            encoded.loc[unknown] = value_to_bin_idx['other']
+        encoded = encoded.fillna(num_bins).to_numpy()
+    else:
+        encoded = np.searchsorted(distribution_bins, values.to_numpy(dtype=float), side='right') - 1
+        encoded = np.clip(encoded, 0, num_bins - 1)
+        encoded[~present.to_numpy()] = num_bins
+    return Series(encoded.astype(utils.compact_unsigned_dtype(num_bins)), index=values.index, name=values.name)
+
+
+def truncate_to_integers(column: Series):
+    """Truncate sampled numbers towards zero. Columns with missing values stay float, since integer arrays cannot hold
+    NaN.
+    """
+    if column.isnull().any():
+        return np.trunc(column)
+    return column.astype(np.int64)
+
+
 class AbstractAttribute(object):
     __metaclass__ = ABCMeta
 
@@ -73,18 +110,44 @@ class AbstractAttribute(object):
             noisy_distribution = self.distribution_probabilities + laplace_noises
             self.distribution_probabilities = utils.normalize_given_distribution(noisy_distribution)
 
-    def encode_values_into_bin_idx(self):
-        """Encode values into bin indices for Bayesian Network construction.
+    def coarsen_domain(self, num_bins: int):
+        """Reduce the domain to num_bins bins, to bound the size of conditional distribution tables.
+
+        Histograms are recomputed with fewer bins, and categorical numbers are turned into a histogram. Categorical
+        strings and datetimes keep the num_bins - 1 most frequent values as strings, and fold the rest into an "other"
+        category. Call infer_distribution afterwards.
 
+        Returns
+        -------
+        list
+            The categories folded into "other", or None if the domain was rebinned.
         """
+        if self.is_categorical and self.data_type in (DataType.STRING, DataType.DATETIME):
+            self.data = self.data.map(str, na_action='ignore')
+            self.data_dropna = self.data.dropna()
+            frequencies = self.data_dropna.value_counts()
+            for value in set(map(str, self.distribution_bins)) - set(frequencies.index):
+                frequencies[value] = 0
+            kept = frequencies.sort_values(ascending=False, kind='stable').index[:num_bins - 1]
+            folded = sorted(set(frequencies.index) - set(kept))
+            self.data = self.data.where(self.data.isin(kept) | self.data.isnull(), 'other')
+            self.data_dropna = self.data.dropna()
+            self.distribution_bins = np.array(sorted(set(kept) | {'other'}))
+            return folded
+
         if self.is_categorical:
-            value_to_bin_idx = {value: idx for idx, value in enumerate(self.distribution_bins)}
-            encoded = self.data.map(lambda x: value_to_bin_idx[x], na_action='ignore')
-        else:
-            encoded = self.data.map(lambda x: bisect_right(self.distribution_bins, x) - 1, na_action='ignore')
+            self.is_categorical = False
+            self.infer_domain()
+        self.histogram_size = num_bins
+        return None
+
+    def encode_values_into_bin_idx(self):
+        """Encode values into bin indices for Bayesian Network construction.
 
-        encoded.fillna(len(self.distribution_bins), inplace=True)
-        return encoded.astype(int, copy=False)
+        Missing values are encoded as len(distribution_bins). Indices are stored in the smallest unsigned integer dtype
+        that holds them.
+        """
+        return encode_values_into_bin_idx(self.data, self.is_categorical, self.distribution_bins)
 
     def to_json(self):
         """Encode attribution information in JSON format / Python dictionary.
@@ -117,18 +180,20 @@ class AbstractAttribute(object):
     def sample_values_from_binning_indices(self, binning_indices):
         """Convert binning indices into values in domain. Used by both independent and correlated attribute mode.
 
+        Categorical indices are looked up in the bins. Numerical indices are drawn uniformly within their bin, where
+        the last bin is as wide as the one before it. The index of missing values, len(distribution_bins), is decoded
+        into NaN.
         """
-        return binning_indices.apply(lambda x: self.uniform_sampling_within_a_bin(x))
-
-    def uniform_sampling_within_a_bin(self, bin_idx: int):
-        num_bins = len(self.distribution_bins)
-        if bin_idx == num_bins:
-            return np.nan
-        elif self.is_categorical:
-            return self.distribution_bins[bin_idx]
-        elif bin_idx < num_bins - 1:
-            return uniform(self.distribution_bins[bin_idx], self.distribution_bins[bin_idx + 1])
+        indices = np.asarray(binning_indices, dtype=np.int64)
+        bins = np.asarray(self.distribution_bins)
+        num_bins = bins.size
+        missing = indices == num_bins
+        indices = np.minimum(indices, num_bins - 1)
+        if self.is_categorical:
+            values = bins[indices]
         else:
-            # sample from the last interval where the right edge is missing in self.distribution_bins
-            neg_2, neg_1 = self.distribution_bins[-2:]
-            return uniform(neg_1, 2 * neg_1 - neg_2)
+            last_bin_width = bins[-1] - bins[-2] if num_bins > 1 else 0
+            right_edges = np.append(bins[1:], bins[-1] + last_bin_width)
+            values = np.random.uniform(bins[indices], right_edges[indices])
+        column = Series(values, index=getattr(binning_indices, 'index', None))
+        return column.where(~missing) if missing.any() else column
@@ -4,7 +4,7 @@ import numpy as np
 from dateutil.parser import parse
 from pandas import Series
 
-from datatypes.AbstractAttribute import AbstractAttribute
+from datatypes.AbstractAttribute import AbstractAttribute, truncate_to_integers
 from datatypes.utils.DataType import DataType
 from lib.utils import normalize_given_distribution
 
@@ -66,9 +66,11 @@ class DateTimeAttribute(AbstractAttribute):
             self.distribution_bins = bins
 
     def generate_values_as_candidate_key(self, n):
-        return np.arange(self.min, self.max, (self.min - self.max) / n)
+        """Keys are timestamps evenly spaced from min, at least one second apart."""
+        step = max((self.max - self.min) // n, 1)
+        return self.min + np.arange(n, dtype=np.int64) * step
 
     def sample_values_from_binning_indices(self, binning_indices):
         column = super().sample_values_from_binning_indices(binning_indices)
-        column[~column.isnull()] = column[~column.isnull()].astype(int)
-        return column
+        # Numerical datetimes are sampled as timestamps in seconds.
+        return column if self.is_categorical else truncate_to_integers(column)
@@ -20,7 +20,10 @@ class FloatAttribute(AbstractAttribute):
         super().infer_distribution()
 
     def generate_values_as_candidate_key(self, n):
-        return np.arange(self.min, self.max, (self.max - self.min) / n)
+        """Keys are evenly spaced over [min, max), or consecutive from min if the range is empty."""
+        if self.max > self.min:
+            return np.linspace(self.min, self.max, num=n, endpoint=False)
+        return self.min + np.arange(n, dtype=float)
 
     def sample_values_from_binning_indices(self, binning_indices):
         return super().sample_values_from_binning_indices(binning_indices)
@@ -2,7 +2,7 @@ from typing import Union
 
 from pandas import Series
 
-from datatypes.AbstractAttribute import AbstractAttribute
+from datatypes.AbstractAttribute import AbstractAttribute, truncate_to_integers
 from datatypes.utils.DataType import DataType
 
 
@@ -24,6 +24,4 @@ class IntegerAttribute(AbstractAttribute):
         return super().generate_values_as_candidate_key(n)
 
     def sample_values_from_binning_indices(self, binning_indices):
-        column = super().sample_values_from_binning_indices(binning_indices)
-        column[~column.isnull()] = column[~column.isnull()].astype(int)
-        return column
+        return truncate_to_integers(super().sample_values_from_binning_indices(binning_indices))
@@ -3,8 +3,9 @@ from typing import Union
 import numpy as np
 from pandas import Series
 
-from datatypes.AbstractAttribute import AbstractAttribute
+from datatypes.AbstractAttribute import AbstractAttribute, truncate_to_integers
 from datatypes.utils.DataType import DataType
+from lib.utils import permute_key_space
 
 
 def pre_process(column: Series):
@@ -33,6 +34,20 @@ def is_ssn(value):
     return False
 
 
+def format_ssn(numbers: np.ndarray):
+    """Format integers between 0 and 1e9 as strings of format AAA-GG-SSSS.
+
+    The characters of all numbers are written into one byte array, one row per number, which is then viewed as fixed
+    width strings.
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    characters = np.full((numbers.size, 11), ord('-'), dtype=np.uint8)
+    digit_columns = [0, 1, 2, 4, 5, 7, 8, 9, 10]
+    for position, digit_column in enumerate(digit_columns):
+        characters[:, digit_column] = numbers // 10 ** (8 - position) % 10 + ord('0')
+    return characters.view('S11').ravel().astype(str)
+
+
 class SocialSecurityNumberAttribute(AbstractAttribute):
     """SocialSecurityNumber of format AAA-GG-SSSS.
 
@@ -52,13 +67,16 @@ class SocialSecurityNumberAttribute(AbstractAttribute):
         super().infer_distribution()
 
     def generate_values_as_candidate_key(self, n):
-        if n < 1e9:
-            values = np.linspace(0, 1e9 - 1, num=n, dtype=int)
-            values = np.random.permutation(values)
-            values = [str(i).zfill(9) for i in values]
-            return ['{}-{}-{}'.format(i[:3], i[3:5], i[5:]) for i in values]
+        """Keys are distinct numbers drawn by a random bijection of [0, 1e9)."""
+        if n <= 1e9:
+            return format_ssn(permute_key_space(n, 10 ** 9))
         else:
-            raise Exception('The candidate key "{}" cannot generate more than 1e9 distinct values.', self.name)
+            raise Exception(f'The candidate key "{self.name}" cannot generate more than 1e9 distinct values.')
 
     def sample_values_from_binning_indices(self, binning_indices):
-        return super().sample_binning_indices_in_independent_attribute_mode(binning_indices)
+        column = truncate_to_integers(super().sample_values_from_binning_indices(binning_indices))
+        present = column.notnull()
+        numbers = np.clip(column[present].to_numpy(dtype=float), 0, 1e9 - 1).astype(np.int64)
+        formatted = column.astype(object)
+        formatted[present] = format_ssn(numbers)
+        return formatted
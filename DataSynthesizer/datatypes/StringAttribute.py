@@ -51,13 +51,17 @@ class StringAttribute(AbstractAttribute):
             self.distribution_bins = bins
 
     def generate_values_as_candidate_key(self, n):
+        """Keys are a random prefix per row, followed by a distinct number drawn by a random bijection of [0, n)."""
         length = np.random.randint(self.min, self.max)
-        vectorized = np.vectorize(lambda x: '{}{}'.format(utils.generate_random_string(length), x))
-        return vectorized(np.arange(n))
+        prefixes = utils.generate_random_strings(np.full(n, length))
+        return np.char.add(prefixes, utils.permute_key_space(n, n).astype(str))
 
     def sample_values_from_binning_indices(self, binning_indices):
         column = super().sample_values_from_binning_indices(binning_indices)
         if not self.is_categorical:
-            column[~column.isnull()] = column[~column.isnull()].apply(lambda x: utils.generate_random_string(int(x)))
+            # Sampled lengths are replaced by strings, which a float column cannot hold.
+            column = column.astype(object)
+            present = column.notnull()
+            column[present] = utils.generate_random_strings(column[present].to_numpy(dtype=float).astype(np.int64))
 
         return column
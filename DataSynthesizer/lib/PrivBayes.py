@@ -1,14 +1,18 @@
+import os
+import pickle
 import random
 import warnings
-from itertools import combinations, product
-from math import log, ceil
-from multiprocessing.pool import Pool
+from itertools import combinations
+from math import log, log2, ceil, comb, prod
+from multiprocessing import cpu_count
+from time import perf_counter
 
 import numpy as np
-import pandas as pd
 from scipy.optimize import fsolve
 
-from lib.utils import mutual_information, normalize_given_distribution
+from lib.parallel import AdaptiveExecutor, get_shared_array
+from lib.utils import (entropy_of_codes, normalize_given_distribution, normalize_conditional_distributions,
+                       encoded_dataset_to_codes, compact_unsigned_dtype)
 
 """
 This module is based on PrivBayes in the following paper:
@@ -17,6 +21,10 @@ Zhang J, Cormode G, Procopiuc CM, Srivastava D, Xiao X.
 PrivBayes: Private Data Release via Bayesian Networks.
 """
 
+# Cost of one cell of a dense noisy table, in elements of entropy_kernel_elements: drawing its Laplace noise, then
+# marginalizing and normalizing the table. Measured as about 27 on a 12M-cell table.
+ELEMENTS_PER_NOISY_CELL = 25
+
 
 def sensitivity(num_tuples):
     """Sensitivity function for Bayesian network construction. PrivBayes Lemma 1.
@@ -96,78 +104,538 @@ def calculate_k(num_attributes, num_tuples, target_usefulness=4, epsilon=0.1):
         return ans
 
 
-def worker(paras):
-    child, V, num_parents, split, dataset = paras
-    parents_pair_list = []
-    mutual_info_list = []
+def mutual_information_estimation_error(cardinalities, k, num_tuples):
+    """Estimated bias of plug-in mutual information estimates for the worst (child, k parents) candidate.
+
+    The plug-in entropy estimate of a distribution with support size m is biased by about (m - 1) / (2n)
+    (Miller-Madow), so the bias of MI(X; P) = H(X) + H(P) - H(X, P) is about (|X| - 1)(|P| - 1) / (2n). This is a
+    first-order estimate of the bias, not a bound on the error: it ignores the variance of the estimates and is loose
+    when n is not much larger than the number of cells. The k+1 largest domains are taken as the worst candidate.
+
+    Parameters
+    ----------
+    cardinalities : list of int
+        Domain size of each attribute.
+    k : int
+        Maximum degree of the Bayesian network.
+    num_tuples : int
+        Number of rows the estimates are computed from.
+    """
+    largest = sorted(cardinalities, reverse=True)[:k + 1]
+    child_cardinality = largest[-1]
+    parents_cardinality = int(np.prod(largest[:-1], dtype=float))
+    return (child_cardinality - 1) * (parents_cardinality - 1) / (2 * num_tuples)
+
+
+def structure_learning_sample_size(cardinalities, k, target_error):
+    """Smallest number of rows whose estimated mutual information bias is no larger than target_error."""
+    return ceil(mutual_information_estimation_error(cardinalities, k, 1) / target_error)
+
+
+def greedy_bayes_workload(num_attributes, k, epsilon=0):
+    """Number of candidates and of new scores in each iteration of greedy_bayes, for planning.
+
+    Scores are cached, so an iteration only scores the candidates containing the attribute added by the previous one,
+    each from the joint entropy of the candidate and of its parents. From the second iteration on, exactly one of the
+    new parent sets is already cached: with parent sets of size p, the first p - 1 attributes of the network plus the
+    attribute added last were scored as a joint entropy when that attribute was a child. With differential privacy,
+    these are the exact numbers of new scores and of passes over the data. Without it, pruning scores fewer
+    candidates, so they are upper bounds. For k=1 without differential privacy, the Chow-Liu tree scores every pair
+    at once, in a single iteration.
+
+    Return a list of dictionaries, one per iteration, of {'candidates', 'mi_evaluations', 'entropy_evaluations',
+    'attributes_per_entropy'}.
+    """
+    if k == 1 and not epsilon:
+        num_pairs = num_attributes * (num_attributes - 1) // 2
+        return [{'candidates': num_pairs,
+                 'mi_evaluations': num_pairs,
+                 'entropy_evaluations': num_pairs + num_attributes,
+                 'attributes_per_entropy': 2}]
+
+    workload = []
+    for num_added in range(1, num_attributes):
+        num_rest = num_attributes - num_added
+        num_parents = min(num_added, k)
+        new_parent_sets = comb(num_added - 1, num_parents - 1)
+        mi_evaluations = num_rest * new_parent_sets
+        workload.append({'candidates': num_rest * comb(num_added, num_parents),
+                         'mi_evaluations': mi_evaluations,
+                         'entropy_evaluations': mi_evaluations + new_parent_sets + (num_rest if num_added == 1 else -1),
+                         'attributes_per_entropy': num_parents + 1})
+    return workload
+
+
+def entropy_kernel_elements(num_rows, cardinalities):
+    """Estimated number of array elements processed by the joint entropy of columns with the given cardinalities.
+
+    Every column is folded into the combined code of each row and the combined codes are counted. If their domain is
+    larger than the number of rows, they are also relabelled by sorting, which dominates the cost.
+    """
+    domain_size = prod(int(cardinality) for cardinality in cardinalities)
+    elements = num_rows * len(cardinalities) + min(domain_size, num_rows)
+    if domain_size > num_rows:
+        elements += num_rows * log2(max(num_rows, 2))
+    return elements
+
+
+def calibrate_entropy_kernel(num_tuples, cardinalities, max_rows=100000, repeat=3):
+    """Seconds per element, as estimated by entropy_kernel_elements, taken by the joint entropy of random codes with
+    the given cardinalities, as measured on this machine. Rows are capped at max_rows.
+    """
+    num_rows = max(min(num_tuples, max_rows), 1)
+    rng = np.random.default_rng(0)
+    dtype = compact_unsigned_dtype(max(cardinalities))
+    columns = [rng.integers(0, cardinality, num_rows).astype(dtype) for cardinality in cardinalities]
+    seconds = []
+    for _ in range(repeat):
+        start = perf_counter()
+        entropy_of_codes(columns, cardinalities)
+        seconds.append(perf_counter() - start)
+    return min(seconds) / entropy_kernel_elements(num_rows, cardinalities)
+
+
+def start_executor(codes, cardinalities, execution_mode=None, max_workers=None):
+    """AdaptiveExecutor sharing the codes and cardinalities of an encoded dataset. If it chooses the execution mode of
+    each map call, estimated costs are converted into seconds by the speed of the entropy kernel on this machine.
+    """
+    seconds_per_element = None
+    if execution_mode is None and (max_workers or cpu_count()) > 1:
+        seconds_per_element = calibrate_entropy_kernel(codes.shape[0], [2, 2])
+    return AdaptiveExecutor({'codes': codes, 'cardinalities': cardinalities}, execution_mode, max_workers,
+                            seconds_per_element=seconds_per_element)
+
+
+class EntropyCache(object):
+    """Joint entropies of attribute sets, keyed by the sorted tuple of attributes.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered by the cache.
+    misses : int
+        Number of lookups that needed a pass over the encoded dataset.
+    """
+
+    def __init__(self):
+        self.entropies = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(attributes):
+        return tuple(sorted(attributes))
+
+    def lookup(self, attributes):
+        """Return the cached entropy, or None after counting a miss."""
+        entropy = self.entropies.get(self.key(attributes))
+        if entropy is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entropy
+
+    def store(self, attributes, entropy):
+        self.entropies[self.key(attributes)] = entropy
+
+    def __getitem__(self, attributes):
+        return self.entropies[self.key(attributes)]
+
+    def __len__(self):
+        return len(self.entropies)
+
+
+class MutualInformationCache(object):
+    """Mutual information of (child, parents) pairs, kept across iterations of greedy_bayes.
 
-    if split + num_parents - 1 < len(V):
+    Keys are (child, sorted tuple of parents), so the order in which parents are enumerated does not matter. Scores are
+    assembled as MI(X; P) = H(X) + H(P) - H(X, P) from an EntropyCache, where H(X) and H(P) are shared by all candidates
+    of an iteration, so a new candidate usually costs one pass over the data for its joint entropy.
+
+    Attributes
+    ----------
+    entropies : EntropyCache
+    hits : int
+        Number of lookups answered by the cache.
+    misses : int
+        Number of lookups that had to be scored.
+    """
+
+    def __init__(self, entropies: EntropyCache = None):
+        self.entropies = entropies or EntropyCache()
+        self.scores = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(child, parents):
+        return child, tuple(sorted(parents))
+
+    def lookup(self, child, parents):
+        """Return the cached score, or None after counting a miss."""
+        score = self.scores.get(self.key(child, parents))
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return score
+
+    def store(self, child, parents, score):
+        self.scores[self.key(child, parents)] = score
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def candidate_parent_sets(V, num_parents):
+    """Enumerate parent sets of size num_parents from V, each exactly once."""
+    for split in range(len(V) - num_parents + 1):
         for other_parents in combinations(V[split + 1:], num_parents - 1):
             parents = list(other_parents)
             parents.append(V[split])
-            parents_pair_list.append((child, parents))
-            # TODO consider to change the computation of MI by combined integers instead of strings.
-            mi = mutual_information(dataset[child], dataset[parents])
-            mutual_info_list.append(mi)
+            yield parents
+
+
+def worker(paras):
+    """Joint entropy of a set of attributes.
+
+    Attributes are given as column indices of the shared array "codes" published by greedy_bayes.
+    """
+    codes = get_shared_array('codes')
+    cardinalities = get_shared_array('cardinalities')
+    return entropy_of_codes([codes[:, attr] for attr in paras], cardinalities[paras])
+
+
+def compute_entropies(attribute_sets, entropies: EntropyCache, pool: AdaptiveExecutor, attr_to_idx):
+    """Fill the entropy cache with every attribute set that is not cached yet, scoring each distinct set once."""
+    missing = {}
+    for attribute_set in attribute_sets:
+        key = entropies.key(attribute_set)
+        if key not in missing and entropies.lookup(key) is None:
+            missing[key] = [attr_to_idx[attr] for attr in key]
+    num_rows = pool.arrays['codes'].shape[0]
+    cardinalities = pool.arrays['cardinalities']
+    cost = sum(entropy_kernel_elements(num_rows, cardinalities[indices]) for indices in missing.values())
+    for key, entropy in zip(missing, pool.map(worker, list(missing.values()), cost)):
+        entropies.store(key, entropy)
+
+
+def score_candidates(parents_pair_list, mutual_info_list, indices, mi_cache: MutualInformationCache, pool,
+                     attr_to_idx):
+    """Score the candidates at the given indices of parents_pair_list and record them in mutual_info_list."""
+    entropies = mi_cache.entropies
+    attribute_sets = []
+    for idx in indices:
+        child, parents = parents_pair_list[idx]
+        attribute_sets += [[child], parents, parents + [child]]
+    compute_entropies(attribute_sets, entropies, pool, attr_to_idx)
+    for idx in indices:
+        child, parents = parents_pair_list[idx]
+        mi = max(entropies[[child]] + entropies[parents] - entropies[parents + [child]], 0.0)
+        mutual_info_list[idx] = mi
+        mi_cache.store(child, parents, mi)
+
+
+def score_candidates_with_pruning(parents_pair_list, mutual_info_list, indices, mi_cache: MutualInformationCache, pool,
+                                  attr_to_idx, tolerance=1e-10):
+    """Score only the candidates that can still beat the best score, and return the number of pruned candidates.
+
+    MI(X; P) is bounded by min(H(X), H(P)), which only needs entropies shared across candidates. Candidates are scored
+    in batches by decreasing bound, until no bound reaches the best score. Candidates whose bound ties the best score
+    are still scored, so the selected candidate is the same as without pruning. Pruned candidates stay None.
+    """
+    entropies = mi_cache.entropies
+    marginal_sets = []
+    for idx in indices:
+        child, parents = parents_pair_list[idx]
+        marginal_sets += [[child], parents]
+    compute_entropies(marginal_sets, entropies, pool, attr_to_idx)
+
+    bounds = {}
+    for idx in indices:
+        child, parents = parents_pair_list[idx]
+        bounds[idx] = min(entropies[[child]], entropies[parents])
+    remaining = sorted(indices, key=lambda idx: bounds[idx], reverse=True)
+
+    best = max((mi for mi in mutual_info_list if mi is not None), default=-np.inf)
+    batch_size = pool.processes * pool.chunks_per_worker
+    while remaining and bounds[remaining[0]] >= best - tolerance:
+        batch = []
+        for idx in remaining[:batch_size]:
+            if bounds[idx] < best - tolerance:
+                break
+            batch.append(idx)
+        remaining = remaining[len(batch):]
+        score_candidates(parents_pair_list, mutual_info_list, batch, mi_cache, pool, attr_to_idx)
+        best = max(best, max(mutual_info_list[idx] for idx in batch))
+    return len(remaining)
+
+
+def pairwise_mutual_information(attributes, mi_cache: MutualInformationCache, pool, attr_to_idx):
+    """Mutual information of every pair of attributes. Return a dictionary of {(attr_x, attr_y): mi}."""
+    pairs = [(x, [y]) for x, y in combinations(attributes, 2)]
+    mutual_info_list = [mi_cache.lookup(child, parents) for child, parents in pairs]
+    uncached = [idx for idx, mi in enumerate(mutual_info_list) if mi is None]
+    score_candidates(pairs, mutual_info_list, uncached, mi_cache, pool, attr_to_idx)
+
+    pairwise_mi = {}
+    for (x, [y]), mi in zip(pairs, mutual_info_list):
+        pairwise_mi[(x, y)] = pairwise_mi[(y, x)] = mi
+        mi_cache.store(y, [x], mi)
+    return pairwise_mi
+
+
+def screen_candidate_parents(child, V, pairwise_mi, max_candidate_parents):
+    """The max_candidate_parents attributes of V that are most informative about child, kept in the order of V."""
+    ranked = sorted(V, key=lambda attr: pairwise_mi[(child, attr)], reverse=True)
+    screened = set(ranked[:max_candidate_parents])
+    return [attr for attr in V if attr in screened]
+
+
+def chow_liu_tree(V, rest_attributes, pairwise_mi):
+    """Grow the maximum spanning tree of pairwise mutual information from V by Prim's algorithm (Chow-Liu).
+
+    For k=1 without differential privacy this is exactly what greedy_bayes selects, including its tie-breaking, but
+    each iteration takes O(d) instead of rescoring every remaining pair. V and rest_attributes are updated in place.
+    """
+    best_parent = {attr: V[0] for attr in rest_attributes}
+    for parent in V[1:]:
+        for attr in rest_attributes:
+            if pairwise_mi[(attr, parent)] > pairwise_mi[(attr, best_parent[attr])]:
+                best_parent[attr] = parent
+
+    N = []
+    while rest_attributes:
+        adding_attribute = max(rest_attributes, key=lambda attr: pairwise_mi[(attr, best_parent[attr])])
+        N.append((adding_attribute, [best_parent[adding_attribute]]))
+        V.append(adding_attribute)
+        rest_attributes.remove(adding_attribute)
+        print(f'Adding attribute {adding_attribute}')
+        for attr in rest_attributes:
+            if pairwise_mi[(attr, adding_attribute)] > pairwise_mi[(attr, best_parent[attr])]:
+                best_parent[attr] = adding_attribute
+    return N
 
-    return parents_pair_list, mutual_info_list
 
+def save_checkpoint(checkpoint_file, checkpoint):
+    """Pickle a checkpoint of greedy_bayes. The file is replaced atomically, so an interruption never corrupts it."""
+    temporary_file = f'{checkpoint_file}.tmp'
+    with open(temporary_file, 'wb') as file:
+        pickle.dump(checkpoint, file)
+    os.replace(temporary_file, checkpoint_file)
 
-def greedy_bayes(dataset, k=2, epsilon=0):
+
+def load_checkpoint(checkpoint_file, attributes, k, epsilon, max_candidate_parents=None, candidate_fraction=None):
+    """Load a checkpoint of greedy_bayes, after checking that it was written for the same input and parameters.
+
+    Attributes are compared as sets, since the column order of the encoded dataset may differ between processes. The
+    checkpoint records the order that the interrupted run enumerated them in.
+    """
+    with open(checkpoint_file, 'rb') as file:
+        checkpoint = pickle.load(file)
+    if set(checkpoint['attributes']) != set(attributes) or checkpoint['k'] != k or checkpoint['epsilon'] != epsilon:
+        raise Exception(f'Checkpoint {checkpoint_file} was written for other attributes, k or epsilon.')
+    if (checkpoint.get('max_candidate_parents') != max_candidate_parents
+            or checkpoint.get('candidate_fraction') != candidate_fraction):
+        raise Exception(f'Checkpoint {checkpoint_file} was written for other max_candidate_parents or '
+                        f'candidate_fraction.')
+    return checkpoint
+
+
+def greedy_bayes(dataset, k=2, epsilon=0, mi_cache: MutualInformationCache = None, max_candidate_parents: int = None,
+                 candidate_fraction: float = None, checkpoint_file: str = None, checkpoint_interval=1,
+                 resume_file: str = None, execution_mode: str = None, max_workers: int = None):
     """Construct a Bayesian Network (BN) using greedy algorithm.
 
+    Scoring runs in an AdaptiveExecutor that lives for the whole construction. It runs small iterations serially,
+    and only starts a process pool sharing the encoded dataset when an iteration is costly enough.
+    Scores are memoized across iterations, so each iteration only scores parent sets that contain the attribute
+    added by the previous one, and are assembled from cached entropies of attribute sets. Without differential privacy,
+    candidates whose entropy bound cannot beat the best score are pruned, and k=1 networks are built as a Chow-Liu
+    tree from a single pairwise mutual information matrix.
+
     Parameters
     ----------
     dataset : DataFrame
-        Input dataset, which only contains categorical attributes.
+        Input dataset encoded into binning indices, i.e., non-negative integers.
     k : int
         Maximum degree of the constructed BN. If k=0, k is automatically calculated.
     epsilon : float
         Parameter of differential privacy.
+    mi_cache : MutualInformationCache
+        Cache of mutual information scores. Pass one in to inspect its hit/miss counters afterwards.
+    max_candidate_parents : int
+        Approximate mode for wide datasets. If set, parents of each child are only drawn from the max_candidate_parents
+        attributes in V with the highest pairwise mutual information with the child. The pairwise scores are noise-free,
+        so this screening is not covered by differential privacy.
+    candidate_fraction : float
+        Stochastic greedy mode. If set, each iteration only scores a random subset of this fraction of the candidates.
+    checkpoint_file : str
+        If set, the partial network, the random states and the cached scores are saved to this file every
+        checkpoint_interval iterations.
+    checkpoint_interval : int
+    resume_file : str
+        Checkpoint to continue from, written with the same k, epsilon, max_candidate_parents and candidate_fraction.
+        The result is identical to an uninterrupted run with the same seed.
+    execution_mode : str
+        'serial' or 'process' to override the execution mode chosen from the estimated cost of each iteration.
+    max_workers : int
+        Maximum number of worker processes. Defaults to os.cpu_count().
     """
-    dataset = dataset.astype(str, copy=False)
     num_tuples, num_attributes = dataset.shape
     if not k:
         k = calculate_k(num_attributes, num_tuples)
+    if mi_cache is None:
+        mi_cache = MutualInformationCache()
+    entropies = mi_cache.entropies
 
-    print('================ Constructing Bayesian Network (BN) ================')
-    root_attribute = random.choice(dataset.columns)
-    V = [root_attribute]
-    rest_attributes = set(dataset.columns)
-    rest_attributes.remove(root_attribute)
-    print(f'Adding ROOT {root_attribute}')
-    N = []
-    while rest_attributes:
-        parents_pair_list = []
-        mutual_info_list = []
-
-        num_parents = min(len(V), k)
-        tasks = [(child, V, num_parents, split, dataset) for child, split in
-                 product(rest_attributes, range(len(V) - num_parents + 1))]
-        with Pool() as pool:
-            res_list = pool.map(worker, tasks)
-
-        for res in res_list:
-            parents_pair_list += res[0]
-            mutual_info_list += res[1]
-
-        if epsilon:
-            sampling_distribution = exponential_mechanism(dataset, mutual_info_list, epsilon)
-            idx = np.random.choice(list(range(len(mutual_info_list))), p=sampling_distribution)
-        else:
-            idx = mutual_info_list.index(max(mutual_info_list))
+    attributes = list(dataset.columns)
+    attr_to_idx = {attr: idx for idx, attr in enumerate(attributes)}
+    codes, cardinalities = encoded_dataset_to_codes(dataset)
 
-        N.append(parents_pair_list[idx])
-        adding_attribute = parents_pair_list[idx][0]
-        V.append(adding_attribute)
-        rest_attributes.remove(adding_attribute)
-        print(f'Adding attribute {adding_attribute}')
+    print('================ Constructing Bayesian Network (BN) ================')
+    if resume_file:
+        checkpoint = load_checkpoint(resume_file, attributes, k, epsilon, max_candidate_parents, candidate_fraction)
+        V = checkpoint['V']
+        N = checkpoint['N']
+        mi_cache.__dict__.update(vars(checkpoint['mi_cache']))
+        entropies = mi_cache.entropies
+        random.setstate(checkpoint['random_state'])
+        np.random.set_state(checkpoint['numpy_random_state'])
+        # Enumerate candidates in the order of the interrupted run, so they are scored and sampled as they would be.
+        attribute_order = checkpoint['attributes']
+        print(f'Resuming from {resume_file} with {len(V)} attributes in BN.')
+    else:
+        root_attribute = random.choice(dataset.columns)
+        V = [root_attribute]
+        attribute_order = attributes
+        print(f'Adding ROOT {root_attribute}')
+        N = []
+    # A list rather than a set, so that candidates are enumerated in the same order in every process.
+    rest_attributes = [attr for attr in attribute_order if attr not in V]
+    with start_executor(codes, cardinalities, execution_mode, max_workers) as pool:
+        if k == 1 and not epsilon and not candidate_fraction:
+            pairwise_mi = pairwise_mutual_information(attributes, mi_cache, pool, attr_to_idx)
+            # Prim's algorithm grows the tree from every attribute in V, so a resumed network is extended.
+            N += chow_liu_tree(V, rest_attributes, pairwise_mi)
+        elif max_candidate_parents:
+            if epsilon:
+                print('Warning: screening candidate parents by noise-free mutual information is not differentially '
+                      'private.')
+            pairwise_mi = pairwise_mutual_information(attributes, mi_cache, pool, attr_to_idx)
+
+        while rest_attributes:
+            num_parents = min(len(V), k)
+            parents_pair_list = []
+            for child in rest_attributes:
+                if max_candidate_parents:
+                    candidate_parents = screen_candidate_parents(child, V, pairwise_mi, max_candidate_parents)
+                else:
+                    candidate_parents = V
+                num_candidate_parents = min(num_parents, len(candidate_parents))
+                parents_pair_list += [(child, parents) for parents in
+                                      candidate_parent_sets(candidate_parents, num_candidate_parents)]
+            if candidate_fraction:
+                num_sampled = max(1, ceil(candidate_fraction * len(parents_pair_list)))
+                sampled = np.sort(np.random.choice(len(parents_pair_list), size=num_sampled, replace=False))
+                parents_pair_list = [parents_pair_list[idx] for idx in sampled]
+            mutual_info_list = [mi_cache.lookup(child, parents) for child, parents in parents_pair_list]
+
+            uncached = [idx for idx, mi in enumerate(mutual_info_list) if mi is None]
+            if epsilon:
+                score_candidates(parents_pair_list, mutual_info_list, uncached, mi_cache, pool, attr_to_idx)
+                sampling_distribution = exponential_mechanism(dataset, mutual_info_list, epsilon)
+                idx = np.random.choice(list(range(len(mutual_info_list))), p=sampling_distribution)
+            else:
+                num_pruned = score_candidates_with_pruning(parents_pair_list, mutual_info_list, uncached, mi_cache,
+                                                           pool, attr_to_idx)
+                print(f'Pruned {num_pruned} of {len(parents_pair_list)} candidates by their entropy bound.')
+                idx = mutual_info_list.index(max(mi for mi in mutual_info_list if mi is not None))
+
+            N.append(parents_pair_list[idx])
+            adding_attribute = parents_pair_list[idx][0]
+            V.append(adding_attribute)
+            rest_attributes.remove(adding_attribute)
+            print(f'Adding attribute {adding_attribute}')
+
+            if checkpoint_file and len(N) % checkpoint_interval == 0:
+                save_checkpoint(checkpoint_file, {'attributes': attribute_order,
+                                                  'k': k,
+                                                  'epsilon': epsilon,
+                                                  'max_candidate_parents': max_candidate_parents,
+                                                  'candidate_fraction': candidate_fraction,
+                                                  'V': V,
+                                                  'N': N,
+                                                  'mi_cache': mi_cache,
+                                                  'random_state': random.getstate(),
+                                                  'numpy_random_state': np.random.get_state()})
 
     print('========================= BN constructed =========================')
+    print(f'Mutual information cache: {mi_cache.hits} hits, {mi_cache.misses} misses.')
+    print(f'Entropy cache: {entropies.hits} hits, {entropies.misses} passes over the dataset.')
 
     return N
 
 
+def bayesian_network_drift(dataset, bayesian_network, mi_cache: MutualInformationCache = None, tolerance=0.05,
+                           execution_mode: str = None, max_workers: int = None):
+    """Check whether a Bayesian network learned on earlier data still fits the dataset.
+
+    For every child, the mutual information of its parents is compared with that of an alternative parent set of the
+    same size: the attributes added before the child that have the highest pairwise mutual information with it. This
+    only scores O(d^2) pairs and 2d parent sets, far fewer than greedy_bayes. The scores are noise-free, so the check
+    is not covered by differential privacy.
+
+    Parameters
+    ----------
+    dataset : DataFrame
+        Input dataset encoded into binning indices.
+    bayesian_network : list
+        List of (child, parents), as returned by greedy_bayes.
+    mi_cache : MutualInformationCache
+    tolerance : float
+        A child has drifted if the alternative parents score more than (1 + tolerance) times its parents.
+    execution_mode : str
+    max_workers : int
+        See greedy_bayes.
+
+    Returns
+    -------
+    list
+        One dictionary per drifted child, with its parents, their mutual information, the alternative parents and
+        their mutual information.
+    """
+    if mi_cache is None:
+        mi_cache = MutualInformationCache()
+    attributes = list(dataset.columns)
+    attr_to_idx = {attr: idx for idx, attr in enumerate(attributes)}
+    codes, cardinalities = encoded_dataset_to_codes(dataset)
+
+    V = [bayesian_network[0][1][0]]
+    parents_pair_list = []
+    with start_executor(codes, cardinalities, execution_mode, max_workers) as pool:
+        pairwise_mi = pairwise_mutual_information(attributes, mi_cache, pool, attr_to_idx)
+        for child, parents in bayesian_network:
+            alternative_parents = screen_candidate_parents(child, V, pairwise_mi, len(parents))
+            parents_pair_list += [(child, list(parents)), (child, alternative_parents)]
+            V.append(child)
+        mutual_info_list = [mi_cache.lookup(child, parents) for child, parents in parents_pair_list]
+        uncached = [idx for idx, mi in enumerate(mutual_info_list) if mi is None]
+        score_candidates(parents_pair_list, mutual_info_list, uncached, mi_cache, pool, attr_to_idx)
+
+    drift = []
+    for idx in range(0, len(parents_pair_list), 2):
+        (child, parents), (_, alternative_parents) = parents_pair_list[idx:idx + 2]
+        mi, alternative_mi = mutual_info_list[idx:idx + 2]
+        if alternative_mi > (1 + tolerance) * mi + 1e-10:
+            drift.append({'attribute': child,
+                          'parents': parents,
+                          'mutual_information': mi,
+                          'alternative_parents': alternative_parents,
+                          'alternative_mutual_information': alternative_mi})
+    return drift
+
+
 def exponential_mechanism(dataset, mutual_info_list, epsilon=0.1):
     """Applied in Exponential Mechanism to sample outcomes."""
     num_tuples, num_attributes = dataset.shape
@@ -183,65 +651,366 @@ def laplace_noise_parameter(k, num_attributes, num_tuples, epsilon):
     return 4 * (num_attributes - k) / (num_tuples * epsilon)
 
 
-def get_noisy_distribution_of_attributes(attributes, encoded_dataset, epsilon=0.1):
-    data = encoded_dataset.copy().loc[:, attributes]
-    data['count'] = 1
-    stats = data.groupby(attributes).sum()
+def count_codes(columns, shape):
+    """Dense contingency table of integer-coded columns, with one axis per column."""
+    flat_indices = np.ravel_multi_index(tuple(columns), shape)
+    counts = np.bincount(flat_indices, minlength=int(np.prod(shape, dtype=float)))
+    return counts.reshape(shape).astype(float)
 
-    iterables = [range(int(encoded_dataset[attr].max()) + 1) for attr in attributes]
-    full_space = pd.DataFrame(columns=attributes, data=list(product(*iterables)))
-    stats.reset_index(inplace=True)
-    stats = pd.merge(full_space, stats, how='left')
-    stats.fillna(0, inplace=True)
 
-    if epsilon:
-        k = len(attributes) - 1
-        num_tuples, num_attributes = encoded_dataset.shape
-        noise_para = laplace_noise_parameter(k, num_attributes, num_tuples, epsilon)
-        laplace_noises = np.random.laplace(0, scale=noise_para, size=stats.index.size)
-        stats['count'] += laplace_noises
-        stats.loc[stats['count'] < 0, 'count'] = 0
+def inject_laplace_noise(stats, noise_para, rng: np.random.Generator):
+    """Inject Laplace noise drawn from rng into every count in place. Negative counts are set to 0."""
+    stats += rng.laplace(0, scale=noise_para, size=stats.shape)
+    stats.clip(0, out=stats)
 
-    return stats
 
+def marginalize_distribution(stats, attributes, target_attributes):
+    """Sum a contingency table over the attributes not in target_attributes, with axes in the order of the target."""
+    summed_axes = tuple(idx for idx, attr in enumerate(attributes) if attr not in target_attributes)
+    stats = stats.sum(axis=summed_axes)
+    remaining = [attr for attr in attributes if attr in target_attributes]
+    return stats.transpose([remaining.index(attr) for attr in target_attributes])
 
-def construct_noisy_conditional_distributions(bayesian_network, encoded_dataset, epsilon=0.1):
-    """See more in Algorithm 1 in PrivBayes.
 
+class SparseConditionalDistribution(object):
+    """Conditional distribution table of a child that only stores some instances of its parents.
+
+    Parent instances that are not stored share one fallback, the marginal distribution of the child.
+
+    Attributes
+    ----------
+    parents_shape : tuple
+        Domain size of each parent.
+    parents_codes : ndarray
+        Sorted flat indices, by np.ravel_multi_index over parents_shape, of the stored parent instances.
+    distributions : ndarray
+        2-D array. Row i is the distribution of the child given the parent instance parents_codes[i].
     """
 
-    k = len(bayesian_network[-1][1])
-    conditional_distributions = {}
+    def __init__(self, parents_shape, parents_codes: np.ndarray, distributions: np.ndarray):
+        self.parents_shape = tuple(parents_shape)
+        self.parents_codes = parents_codes
+        self.distributions = distributions
 
-    # first k+1 attributes
-    root = bayesian_network[0][1][0]
-    kplus1_attributes = [root]
-    for child, _ in bayesian_network[:k]:
-        kplus1_attributes.append(child)
+    def parents_instances(self):
+        """Stored parent instances, as tuples of python ints."""
+        return zip(*(axis.tolist() for axis in np.unravel_index(self.parents_codes, self.parents_shape)))
 
-    noisy_dist_of_kplus1_attributes = get_noisy_distribution_of_attributes(kplus1_attributes, encoded_dataset, epsilon)
 
-    # generate noisy distribution of root attribute.
-    root_stats = noisy_dist_of_kplus1_attributes.loc[:, [root, 'count']].groupby(root).sum()['count']
-    conditional_distributions[root] = normalize_given_distribution(root_stats).tolist()
+def count_codes_sparsely(columns, shape):
+    """Non-empty cells of the contingency table of integer-coded columns, found by sorting instead of expanding the
+    full space. Return (cells, counts): sorted flat indices of the non-empty cells and their counts.
+    """
+    cells, counts = np.unique(np.ravel_multi_index(tuple(columns), shape), return_counts=True)
+    return cells, counts.astype(float)
 
-    for idx, (child, parents) in enumerate(bayesian_network):
-        conditional_distributions[child] = {}
 
-        if idx < k:
-            stats = noisy_dist_of_kplus1_attributes.copy().loc[:, parents + [child, 'count']]
-        else:
-            stats = get_noisy_distribution_of_attributes(parents + [child], encoded_dataset, epsilon)
+def marginalize_sparse_distribution(shape, cells, counts, attributes, target_attributes):
+    """Sum the non-empty cells of a sparse contingency table onto target_attributes.
 
-        stats = pd.DataFrame(stats.loc[:, parents + [child, 'count']].groupby(parents + [child]).sum())
+    Return (target_shape, target_cells, target_counts): target cells that some non-empty cell is summed into, and their
+    counts. Every other target cell is empty.
+    """
+    instances = np.unravel_index(cells, shape)
+    target_shape = tuple(shape[attributes.index(attr)] for attr in target_attributes)
+    target_flat_indices = np.ravel_multi_index(tuple(instances[attributes.index(attr)] for attr in target_attributes),
+                                               target_shape)
+    target_cells, inverse = np.unique(target_flat_indices, return_inverse=True)
+    target_counts = np.bincount(inverse.ravel(), weights=counts, minlength=target_cells.size)
+    return target_shape, target_cells, target_counts
 
-        if len(parents) == 1:
-            for parent_instance in stats.index.levels[0]:
-                dist = normalize_given_distribution(stats.loc[parent_instance]['count']).tolist()
-                conditional_distributions[child][str([parent_instance])] = dist
-        else:
-            for parents_instance in product(*stats.index.levels[:-1]):
-                dist = normalize_given_distribution(stats.loc[parents_instance]['count']).tolist()
-                conditional_distributions[child][str(list(parents_instance))] = dist
 
+def group_cells_by_parents(shape, cells, counts):
+    """Arrange the non-empty cells of a (parents + child) table into one row per parent instance with such a cell.
+
+    Return (parents_codes, table). Cells of those rows that are not given are empty.
+    """
+    child_size = shape[-1]
+    parents_codes, rows = np.unique(cells // child_size, return_inverse=True)
+    table = np.zeros((parents_codes.size, child_size), dtype=float)
+    table[rows.ravel(), cells % child_size] = counts
+    return parents_codes, table
+
+
+def count_attributes(codes, cardinalities, attributes, sparse=False, count_cache: dict = None):
+    """Noise-free contingency table of the given column indices, by count_codes, or by count_codes_sparsely if sparse.
+
+    If count_cache is given, tables are memoized in it, keyed by (sparse, attributes), and a copy is returned.
+    """
+    key = (sparse, tuple(attributes))
+    if count_cache is None or key not in count_cache:
+        shape = tuple(cardinalities[attributes].tolist())
+        columns = [codes[:, attr] for attr in attributes]
+        table = count_codes_sparsely(columns, shape) if sparse else count_codes(columns, shape)
+        if count_cache is None:
+            return table
+        count_cache[key] = table
+    table = count_cache[key]
+    return tuple(array.copy() for array in table) if sparse else table.copy()
+
+
+def dense_conditional_tensors(network, codes, cardinalities, noise_para, rng, first_part, count_cache=None):
+    """Conditional distribution tables of one part of a Bayesian network. See construct_noisy_conditional_tensors."""
+    conditional_tensors = {}
+    if first_part:
+        root = network[0][1][0]
+        kplus1_attributes = [root] + [child for child, _ in network]
+        stats = count_attributes(codes, cardinalities, kplus1_attributes, count_cache=count_cache)
+        if noise_para:
+            inject_laplace_noise(stats, noise_para, rng)
+
+        # generate noisy distribution of root attribute.
+        root_stats = marginalize_distribution(stats, kplus1_attributes, [root])
+        conditional_tensors[root] = normalize_given_distribution(root_stats)
+        for child, parents in network:
+            child_stats = marginalize_distribution(stats, kplus1_attributes, parents + [child])
+            conditional_tensors[child] = normalize_conditional_distributions(child_stats)
+    else:
+        [(child, parents)] = network
+        stats = count_attributes(codes, cardinalities, parents + [child], count_cache=count_cache)
+        if noise_para:
+            inject_laplace_noise(stats, noise_para, rng)
+        conditional_tensors[child] = normalize_conditional_distributions(stats)
+    return conditional_tensors
+
+
+def sparse_noise_threshold(noise_para, num_cells, num_tuples):
+    """Noisy counts at or below this threshold are left out of sparse tables.
+
+    It only depends on public quantities, and is chosen so that the expected number of empty cells whose Laplace noise
+    exceeds it is at most num_tuples: an empty cell passes with probability exp(-threshold / noise_para) / 2.
+    """
+    return noise_para * log(max(1.0, num_cells / (2 * num_tuples)))
+
+
+def sample_empty_cells(num_cells, cells, num_samples, rng):
+    """Draw num_samples distinct flat indices uniformly from [0, num_cells), excluding the sorted array cells."""
+    if num_cells <= 4 * (cells.size + num_samples):
+        empty_cells = np.setdiff1d(np.arange(num_cells), cells, assume_unique=True)
+        return np.sort(rng.choice(empty_cells, size=num_samples, replace=False))
+    # The domain is much larger than the cells to avoid, so uniform draws are rarely rejected.
+    drawn = np.empty(0, dtype=np.int64)
+    while drawn.size < num_samples:
+        candidates = rng.integers(num_cells, size=2 * (num_samples - drawn.size))
+        drawn = np.union1d(drawn, candidates[~np.isin(candidates, cells)])
+    return np.sort(rng.choice(drawn, size=num_samples, replace=False))
+
+
+def inject_laplace_noise_sparsely(shape, cells, counts, noise_para, num_tuples, rng):
+    """Sparse counterpart of inject_laplace_noise followed by setting counts at or below sparse_noise_threshold to 0.
+
+    Noise is drawn for the non-empty cells. Empty cells are not materialized: the number of them whose noise exceeds the
+    threshold is drawn from a binomial distribution, they are placed uniformly at random among the empty cells, and
+    their counts are the threshold plus exponential noise, which is the distribution of Laplace noise above a positive
+    threshold. Return the sorted cells above the threshold and their noisy counts.
+    """
+    num_cells = prod(shape)
+    threshold = sparse_noise_threshold(noise_para, num_cells, num_tuples)
+    counts = counts + rng.laplace(0, scale=noise_para, size=counts.size)
+    kept = counts > threshold
+    num_empty_kept = rng.binomial(num_cells - cells.size, np.exp(-threshold / noise_para) / 2)
+    empty_cells = sample_empty_cells(num_cells, cells, num_empty_kept, rng)
+    empty_counts = threshold + rng.exponential(noise_para, size=num_empty_kept)
+
+    all_cells = np.concatenate([cells[kept], empty_cells])
+    order = np.argsort(all_cells)
+    return all_cells[order], np.concatenate([counts[kept], empty_counts])[order]
+
+
+def sparse_conditional_tensors(network, codes, cardinalities, noise_para, rng, first_part, count_cache=None):
+    """Sparse counterpart of dense_conditional_tensors.
+
+    Children map to SparseConditionalDistribution, built from the cells of the noisy contingency table that exceed
+    sparse_noise_threshold, see inject_laplace_noise_sparsely. Which parent instances are stored therefore depends on
+    noisy counts only, as the dense table that is thresholded after noise injection would. Without noise, the stored
+    parent instances are the observed ones.
+    """
+    num_tuples = codes.shape[0]
+    conditional_tensors = {}
+    if first_part:
+        root = network[0][1][0]
+        kplus1_attributes = [root] + [child for child, _ in network]
+        shape = tuple(cardinalities[kplus1_attributes].tolist())
+        cells, counts = count_attributes(codes, cardinalities, kplus1_attributes, True, count_cache)
+        if noise_para:
+            cells, counts = inject_laplace_noise_sparsely(shape, cells, counts, noise_para, num_tuples, rng)
+
+        # generate noisy distribution of root attribute.
+        root_shape, root_cells, root_counts = marginalize_sparse_distribution(shape, cells, counts, kplus1_attributes,
+                                                                              [root])
+        root_stats = np.zeros(root_shape)
+        root_stats[root_cells] = root_counts
+        conditional_tensors[root] = normalize_given_distribution(root_stats)
+
+        for child, parents in network:
+            child_shape, child_cells, child_counts = marginalize_sparse_distribution(shape, cells, counts,
+                                                                                     kplus1_attributes,
+                                                                                     parents + [child])
+            parents_codes, stats = group_cells_by_parents(child_shape, child_cells, child_counts)
+            conditional_tensors[child] = SparseConditionalDistribution(child_shape[:-1], parents_codes,
+                                                                       normalize_conditional_distributions(stats))
+    else:
+        [(child, parents)] = network
+        child_shape = tuple(cardinalities[parents + [child]].tolist())
+        cells, counts = count_attributes(codes, cardinalities, parents + [child], True, count_cache)
+        if noise_para:
+            cells, counts = inject_laplace_noise_sparsely(child_shape, cells, counts, noise_para, num_tuples, rng)
+        parents_codes, stats = group_cells_by_parents(child_shape, cells, counts)
+        conditional_tensors[child] = SparseConditionalDistribution(child_shape[:-1], parents_codes,
+                                                                   normalize_conditional_distributions(stats))
+    return conditional_tensors
+
+
+def build_conditional_tensors_part(network, codes, cardinalities, noise_para, seed, part, sparse, count_cache=None):
+    """Conditional distribution tables of one part of a Bayesian network.
+
+    Attributes are given as column indices of codes and cardinalities. Noise is drawn from a stream derived from the
+    seed and the index of the part, so it does not depend on which process builds the part.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(part,)))
+    build = sparse_conditional_tensors if sparse else dense_conditional_tensors
+    return build(network, codes, cardinalities, noise_para, rng, part == 0, count_cache)
+
+
+def conditional_tensors_worker(paras):
+    """Build one part of a Bayesian network from the shared arrays "codes" and "cardinalities"."""
+    network, noise_para, seed, part, sparse = paras
+    codes = get_shared_array('codes')
+    cardinalities = get_shared_array('cardinalities')
+    return build_conditional_tensors_part(network, codes, cardinalities, noise_para, seed, part, sparse)
+
+
+def construct_noisy_conditional_tensors(bayesian_network, encoded_dataset, epsilon=0.1, seed=None, sparse=False,
+                                        count_cache: dict = None, execution_mode: str = None, max_workers: int = None):
+    """See more in Algorithm 1 in PrivBayes.
+
+    Return a dictionary of {attribute: ndarray}. The root maps to its 1-D distribution. Every child maps to its
+    conditional distribution table, whose axes are its parents followed by itself, so that
+    table[parents_instance] is the distribution of the child given that instance of its parents.
+
+    The network is split into independent parts: the root with the first k children, whose tables all derive from one
+    noisy (k+1)-way table, and every later child on its own. The parts are built in an AdaptiveExecutor, see
+    greedy_bayes for execution_mode and max_workers. Each part draws its noise from its own stream derived from seed,
+    so the result is reproducible whatever the number of workers. If seed is None, it is drawn from numpy's global
+    random state.
+
+    If sparse is True, children map to SparseConditionalDistribution instead, which only stores the parent instances
+    with a noisy count above sparse_noise_threshold, or the observed ones without noise.
+
+    If count_cache is given, the parts are built in this process instead, and their noise-free contingency tables are
+    memoized in count_cache. Pass the same dictionary to calls on the same encoded dataset, e.g. across a sweep of
+    epsilon and k, to count every table only once. The result does not depend on whether count_cache is given.
+    """
+    k = len(bayesian_network[-1][1])
+    num_tuples, num_attributes = encoded_dataset.shape
+    noise_para = laplace_noise_parameter(k, num_attributes, num_tuples, epsilon) if epsilon else 0
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+
+    attributes = list(encoded_dataset.columns)
+    attr_to_idx = {attr: idx for idx, attr in enumerate(attributes)}
+    codes, cardinalities = encoded_dataset_to_codes(encoded_dataset)
+
+    network = [(attr_to_idx[child], [attr_to_idx[parent] for parent in parents])
+               for child, parents in bayesian_network]
+    parts = [network[:k]] + [[child_parents] for child_parents in network[k:]]
+    tasks = [(part_network, noise_para, int(seed), part, sparse) for part, part_network in enumerate(parts)]
+    if count_cache is not None:
+        res_list = [build_conditional_tensors_part(part_network, codes, cardinalities, noise_para, int(seed), part,
+                                                   sparse, count_cache)
+                    for part, part_network in enumerate(parts)]
+    else:
+        max_workers = min(len(tasks), max_workers or cpu_count())
+        # Each part counts the table of its last child and parents, and dense tables are noised cell by cell.
+        cost = 0
+        for part_network in parts:
+            child, parents = part_network[-1]
+            table_cardinalities = cardinalities[parents + [child]]
+            cost += entropy_kernel_elements(num_tuples, table_cardinalities)
+            if not sparse:
+                cost += ELEMENTS_PER_NOISY_CELL * prod(int(cardinality) for cardinality in table_cardinalities)
+        with start_executor(codes, cardinalities, execution_mode, max_workers) as pool:
+            res_list = pool.map(conditional_tensors_worker, tasks, cost)
+
+    conditional_tensors = {}
+    for res in res_list:
+        for attr, tensor in res.items():
+            conditional_tensors[attributes[attr]] = tensor
+    return conditional_tensors
+
+
+def conditional_table_attributes(bayesian_network):
+    """Attributes of the contingency table counted for each part of the network, see
+    construct_noisy_conditional_tensors: the root and the first k children, then the parents and child of every later
+    child.
+    """
+    k = len(bayesian_network[-1][1])
+    root = bayesian_network[0][1][0]
+    tables = [[root] + [child for child, _ in bayesian_network[:k]]]
+    tables += [parents + [child] for child, parents in bayesian_network[k:]]
+    return tables
+
+
+def construct_noisy_conditional_tensors_from_counts(bayesian_network, counts, num_tuples, epsilon=0.1, seed=None):
+    """Counterpart of construct_noisy_conditional_tensors for contingency tables counted elsewhere, e.g. summed over
+    shards of the dataset.
+
+    Parameters
+    ----------
+    bayesian_network : list
+    counts : dict
+        Dictionary of {tuple of attributes: dense contingency table}, for every attribute list of
+        conditional_table_attributes(bayesian_network).
+    num_tuples : int
+        Number of tuples the tables are counted from.
+    epsilon : float
+    seed : int
+        Noise is drawn as by construct_noisy_conditional_tensors, so the same seed gives the same result.
+    """
+    k = len(bayesian_network[-1][1])
+    attributes = [bayesian_network[0][1][0]] + [child for child, _ in bayesian_network]
+    noise_para = laplace_noise_parameter(k, len(attributes), num_tuples, epsilon) if epsilon else 0
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+
+    attr_to_idx = {attr: idx for idx, attr in enumerate(attributes)}
+    count_cache = {(False, tuple(attr_to_idx[attr] for attr in table_attributes)): table
+                   for table_attributes, table in counts.items()}
+    network = [(attr_to_idx[child], [attr_to_idx[parent] for parent in parents])
+               for child, parents in bayesian_network]
+    parts = [network[:k]] + [[child_parents] for child_parents in network[k:]]
+
+    conditional_tensors = {}
+    for part, part_network in enumerate(parts):
+        res = build_conditional_tensors_part(part_network, None, None, noise_para, int(seed), part, False, count_cache)
+        for attr, tensor in res.items():
+            conditional_tensors[attributes[attr]] = tensor
+    return conditional_tensors
+
+
+def conditional_tensors_to_distributions(conditional_tensors, bayesian_network):
+    """Convert conditional distribution tables into the dictionaries stored in dataset descriptions.
+
+    The root maps to a list of probabilities. Every child maps to {str([parents_instance]): list of probabilities}.
+    Sparse tables only yield their stored parent instances.
+    """
+    root = bayesian_network[0][1][0]
+    conditional_distributions = {root: conditional_tensors[root].tolist()}
+    for child, _ in bayesian_network:
+        table = conditional_tensors[child]
+        if isinstance(table, SparseConditionalDistribution):
+            rows = table.distributions.tolist()
+            keys = [str(list(parents_instance)) for parents_instance in table.parents_instances()]
+        else:
+            rows = table.reshape(-1, table.shape[-1]).tolist()
+            keys = [str(list(parents_instance)) for parents_instance in np.ndindex(table.shape[:-1])]
+        conditional_distributions[child] = dict(zip(keys, rows))
     return conditional_distributions
+
+
+def construct_noisy_conditional_distributions(bayesian_network, encoded_dataset, epsilon=0.1, seed=None):
+    """See more in Algorithm 1 in PrivBayes.
+
+    """
+    conditional_tensors = construct_noisy_conditional_tensors(bayesian_network, encoded_dataset, epsilon, seed)
+    return conditional_tensors_to_distributions(conditional_tensors, bayesian_network)
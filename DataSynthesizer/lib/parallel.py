@@ -0,0 +1,189 @@
+from math import ceil
+from multiprocessing import cpu_count, shared_memory
+from multiprocessing.pool import Pool
+from typing import Dict
+
+import numpy as np
+
+"""
+Process pools whose workers read NumPy arrays published once in shared memory, instead of receiving a pickled copy of
+the dataset with every task, and an executor that only starts such a pool when the work is worth it.
+"""
+
+# A map call runs in worker processes if its estimated serial run time is at least this many seconds, several times
+# the startup of a SharedArrayPool (about 0.03 s for 4 workers) and the transfer of its tasks and results. Threads
+# are not used: the kernels hold the GIL for most of their run time, and a thread pool measured slower than serial.
+PROCESS_MIN_SECONDS = 0.2
+# Seconds per array element assumed when no calibrated speed is given, about the speed of the entropy kernel.
+DEFAULT_SECONDS_PER_ELEMENT = 2e-9
+EXECUTION_MODES = ('serial', 'process')
+
+# Arrays attached by the pool initializer, keyed by the names given to SharedArrayPool.
+_worker_arrays: Dict[str, np.ndarray] = {}
+# Keep the SharedMemory handles alive for as long as the worker process uses the arrays.
+_worker_memory = []
+
+
+class SharedArray(object):
+    """A NumPy array copied once into a shared memory block.
+
+    Attributes
+    ----------
+    array : ndarray
+        View of the shared memory block.
+    descriptor : tuple
+        (name, shape, dtype, order), sufficient for another process to attach to the block.
+    """
+
+    def __init__(self, array: np.ndarray):
+        order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+        self._memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._memory.buf, order=order)
+        self.array[...] = array
+        self.descriptor = (self._memory.name, array.shape, array.dtype.str, order)
+
+    def release(self):
+        self.array = None
+        self._memory.close()
+        self._memory.unlink()
+
+
+def attach_shared_arrays(descriptors: Dict[str, tuple]):
+    """Pool initializer. Attach to every shared array without copying it."""
+    for key, (name, shape, dtype, order) in descriptors.items():
+        memory = shared_memory.SharedMemory(name=name)
+        _worker_memory.append(memory)
+        _worker_arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, order=order)
+
+
+def get_shared_array(key: str):
+    """Return an array published by the SharedArrayPool that runs the current task."""
+    return _worker_arrays[key]
+
+
+class SharedArrayPool(object):
+    """A process pool that lives across many map calls and shares read-only arrays with its workers.
+
+    Parameters
+    ----------
+    arrays : dict
+        Dictionary of {key: ndarray}. Worker functions read them by get_shared_array(key).
+    processes : int
+        Number of worker processes. Defaults to os.cpu_count().
+    chunks_per_worker : int
+        Tasks of each map call are batched into about this many chunks per worker process.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], processes: int = None, chunks_per_worker: int = 4):
+        self.chunks_per_worker = chunks_per_worker
+        self.shared_arrays = {}
+        try:
+            for key, array in arrays.items():
+                self.shared_arrays[key] = SharedArray(array)
+            descriptors = {key: shared.descriptor for key, shared in self.shared_arrays.items()}
+            self.pool = Pool(processes, initializer=attach_shared_arrays, initargs=(descriptors,))
+        except Exception:
+            self.release_shared_arrays()
+            raise
+        self.processes = self.pool._processes
+
+    def map(self, func, tasks):
+        chunksize = max(1, ceil(len(tasks) / (self.processes * self.chunks_per_worker)))
+        return self.pool.map(func, tasks, chunksize=chunksize)
+
+    def release_shared_arrays(self):
+        for shared in self.shared_arrays.values():
+            shared.release()
+        self.shared_arrays = {}
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.release_shared_arrays()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.release_shared_arrays()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+
+class AdaptiveExecutor(object):
+    """Run each map call serially or in a SharedArrayPool, depending on its estimated cost.
+
+    Workers read the arrays by get_shared_array(key) in both modes. The process pool is started on the first map call
+    that needs it, and reused by later calls.
+
+    Parameters
+    ----------
+    arrays : dict
+        Dictionary of {key: ndarray}.
+    mode : str
+        'serial' or 'process' to force an execution mode. By default, it is chosen per map call.
+    max_workers : int
+        Maximum number of processes. Defaults to os.cpu_count(). Automatic mode is serial if it is 1.
+    chunks_per_worker : int
+        Tasks of each map call are batched into about this many chunks per worker.
+    seconds_per_element : float
+        Speed that converts the estimated cost of a map call, in array elements, into seconds, e.g. as calibrated on
+        this machine by calibrate_entropy_kernel. Defaults to DEFAULT_SECONDS_PER_ELEMENT.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], mode: str = None, max_workers: int = None,
+                 chunks_per_worker: int = 4, seconds_per_element: float = None):
+        if mode is not None and mode not in EXECUTION_MODES:
+            raise Exception(f'Execution mode should be one of {EXECUTION_MODES}, not {mode}.')
+        self.arrays = arrays
+        self.mode = mode
+        self.processes = max_workers or cpu_count()
+        self.chunks_per_worker = chunks_per_worker
+        self.seconds_per_element = seconds_per_element or DEFAULT_SECONDS_PER_ELEMENT
+        self.process_pool = None
+        _worker_arrays.update(arrays)
+
+    def choose_mode(self, cost=None):
+        """Execution mode of a map call whose estimated cost is the number of array elements it processes."""
+        if self.mode:
+            return self.mode
+        if self.processes == 1 or cost is None or cost * self.seconds_per_element < PROCESS_MIN_SECONDS:
+            return 'serial'
+        return 'process'
+
+    def map(self, func, tasks, cost=None):
+        if self.choose_mode(cost) == 'serial':
+            return [func(task) for task in tasks]
+        if self.process_pool is None:
+            self.process_pool = SharedArrayPool(self.arrays, self.processes, self.chunks_per_worker)
+        return self.process_pool.map(func, tasks)
+
+    def shutdown(self, wait=True):
+        if self.process_pool is not None:
+            if wait:
+                self.process_pool.close()
+            else:
+                self.process_pool.terminate()
+        for key in self.arrays:
+            _worker_arrays.pop(key, None)
+
+    def close(self):
+        self.shutdown()
+
+    def terminate(self):
+        self.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,224 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from pandas import DataFrame, Series
+
+from datatypes.utils.AttributeLoader import parse_json
+from lib.utils import read_json_file, compact_unsigned_dtype
+
+"""
+Sampling plans compiled once from a dataset description, so that repeated generate calls neither re-read the
+description nor rebuild its distributions. Distributions are sampled through Walker alias tables, in O(1) per draw.
+"""
+
+# Number of compiled plans kept by load_sampling_plan.
+MAX_CACHED_PLANS = 16
+
+
+def alias_tables(distributions: np.ndarray):
+    """Walker alias tables of every row of a 2-D array of distributions, vectorized over rows.
+
+    Return (probabilities, aliases), both of the shape of distributions. A draw from row r picks a column c uniformly,
+    then keeps c with probability probabilities[r, c], and takes aliases[r, c] otherwise.
+
+    Columns are paired as by the sweep of Vose's method, in which small columns (scaled probability below 1) are
+    filled up by the first large column, until it falls below 1 itself and is filled up by the next large column. The
+    large column of each small column is found by comparing cumulative sums, so that building the tables takes
+    O(rows * values * log(rows * values)) instead of one pass over the whole array per column.
+    """
+    num_rows, num_values = distributions.shape
+    sums = distributions.sum(axis=1, keepdims=True)
+    scaled = np.where(sums > 0, distributions * num_values / np.where(sums > 0, sums, 1), 1.0)
+    probabilities = np.ones((num_rows, num_values))
+    aliases = np.tile(np.arange(num_values), (num_rows, 1))
+    small = scaled < 1
+    if not small.any():
+        return probabilities, aliases
+    deficits = np.where(small, 1 - scaled, 0)
+    cumulative_excesses = np.cumsum(np.where(small, 0, scaled - 1), axis=1)
+    large_rows, large_columns = np.nonzero(~small)
+    small_rows, small_columns = np.nonzero(small)
+
+    # A small column is filled up by the first large column of its row whose cumulative excess reaches the deficits of
+    # the small columns before it. Offsetting each row by more than its total keeps the rows apart in one search.
+    row_offsets = np.arange(num_rows)[:, np.newaxis] * (2.0 * num_values + 2)
+    keys = (cumulative_excesses + row_offsets)[large_rows, large_columns]
+    deficits_before = (np.cumsum(deficits, axis=1) - deficits + row_offsets)[small_rows, small_columns]
+    last_large = np.cumsum(np.bincount(large_rows, minlength=num_rows)) - 1
+    donors = np.minimum(np.searchsorted(keys, deficits_before), last_large[small_rows])
+    probabilities[small_rows, small_columns] = scaled[small_rows, small_columns]
+    aliases[small_rows, small_columns] = large_columns[donors]
+
+    # A large column keeps 1 + its cumulative excess - the deficits it and the large columns before it filled up. If
+    # that is below 1, the next large column of the row fills it up. Rounding errors are left to the last one.
+    received = np.zeros((num_rows, num_values))
+    received[large_rows, large_columns] = np.bincount(donors, weights=deficits[small_rows, small_columns],
+                                                      minlength=large_columns.size)
+    balances = (1 + cumulative_excesses - np.cumsum(received, axis=1))[large_rows, large_columns]
+    spent = np.flatnonzero((balances < 1) & np.append(large_rows[1:] == large_rows[:-1], False))
+    probabilities[large_rows[spent], large_columns[spent]] = np.maximum(balances[spent], 0)
+    aliases[large_rows[spent], large_columns[spent]] = large_columns[spent + 1]
+    return probabilities, aliases
+
+
+def sample_alias_tables(probabilities: np.ndarray, aliases: np.ndarray, rows: np.ndarray):
+    """Draw one value from the alias table of the given row, for every entry of rows."""
+    columns = np.random.randint(probabilities.shape[1], size=rows.size)
+    kept = np.random.uniform(size=rows.size) < probabilities[rows, columns]
+    return np.where(kept, columns, aliases[rows, columns])
+
+
+class ConditionalSampler(object):
+    """Alias tables of the conditional distributions of a child, and the lookup from parents instances to them.
+
+    Parameters
+    ----------
+    distributions : ndarray
+        2-D array with one conditional distribution per row.
+    parents_shape : tuple
+        Domain size of each parent.
+    instances_index : ndarray
+        Flat index, by np.ravel_multi_index over parents_shape, of the parents instance of each row. If None, rows are
+        every instance of parents_shape in order, as in a dense table.
+    """
+
+    def __init__(self, distributions: np.ndarray, parents_shape, instances_index: np.ndarray = None):
+        self.probabilities, self.aliases = alias_tables(distributions)
+        self.parents_shape = tuple(parents_shape)
+        if instances_index is None:
+            self.order = None
+            self.sorted_index = None
+        else:
+            self.order = np.argsort(instances_index)
+            self.sorted_index = instances_index[self.order]
+
+    def rows(self, parents_codes):
+        """Row of the distribution given the parents instance of every sample, or -1 if there is none."""
+        rows = np.full(parents_codes[0].size, -1, dtype=np.int64)
+        in_shape = np.logical_and.reduce([codes < size for codes, size in zip(parents_codes, self.parents_shape)])
+        index = np.ravel_multi_index([codes[in_shape] for codes in parents_codes], self.parents_shape)
+        if self.sorted_index is None:
+            rows[in_shape] = index
+        elif self.sorted_index.size:
+            positions = np.minimum(np.searchsorted(self.sorted_index, index), self.sorted_index.size - 1)
+            rows[in_shape] = np.where(self.sorted_index[positions] == index, self.order[positions], -1)
+        return rows
+
+    def sample(self, rows):
+        return sample_alias_tables(self.probabilities, self.aliases, rows)
+
+
+class SamplingPlan(object):
+    """A dataset description compiled for repeated sampling.
+
+    Attributes
+    ----------
+    description : dict
+        The dataset description.
+    columns : dict
+        Dictionary of {attribute: AbstractAttribute}, whose distribution_bins and distribution_probabilities are
+        ndarrays.
+    marginals : dict
+        Dictionary of {attribute: (probabilities, aliases)}, alias tables of distribution_probabilities.
+    bayesian_network : list
+        Empty if the description has no Bayesian network.
+    sampling_order : list
+        Attributes of the Bayesian network, in topological order.
+    conditionals : dict
+        Dictionary of {child: ConditionalSampler}.
+    dtype : dtype
+        Smallest unsigned integer dtype that holds the binning indices of every attribute.
+    """
+
+    def __init__(self, description):
+        self.description = description
+        self.columns = {}
+        self.marginals = {}
+        for attr, attr_info in description['attribute_description'].items():
+            column = parse_json(attr_info)
+            column.distribution_bins = np.array(column.distribution_bins)
+            column.distribution_probabilities = np.array(column.distribution_probabilities, dtype=float)
+            self.columns[attr] = column
+            self.marginals[attr] = alias_tables(column.distribution_probabilities[np.newaxis, :])
+
+        self.bayesian_network = description.get('bayesian_network', [])
+        self.sampling_order = []
+        self.conditionals = {}
+        self.dtype = None
+        if self.bayesian_network:
+            self.compile_bayesian_network()
+
+    def compile_bayesian_network(self):
+        root = self.bayesian_network[0][1][0]
+        self.sampling_order = [root] + [child for child, _ in self.bayesian_network]
+        # Binning indices range up to len(distribution_bins), the index of missing values.
+        self.dtype = compact_unsigned_dtype(max(len(self.columns[attr].distribution_bins)
+                                                for attr in self.sampling_order))
+        conditional_probabilities = self.description['conditional_probabilities']
+        tensors = self.description.get('conditional_probability_tensors', {})
+
+        root_distribution = np.array(conditional_probabilities[root], dtype=float)
+        self.conditionals[root] = ConditionalSampler(root_distribution[np.newaxis, :], ())
+        # Largest binning index that each attribute can be sampled with, + 1.
+        domain_sizes = {root: max(root_distribution.size, self.columns[root].distribution_probabilities.size)}
+        for child, parents in self.bayesian_network:
+            if child in tensors:
+                table = np.asarray(tensors[child], dtype=float)
+                distributions = table.reshape(-1, table.shape[-1])
+                self.conditionals[child] = ConditionalSampler(distributions, table.shape[:-1])
+            else:
+                conditional_distributions = conditional_probabilities[child]
+                parents_instances = np.array([parse_parents_instance(key) for key in conditional_distributions],
+                                             dtype=np.int64).reshape(-1, len(parents))
+                distributions = np.array(list(conditional_distributions.values()), dtype=float)
+                parents_shape = tuple(domain_sizes[parent] for parent in parents)
+                instances_index = np.ravel_multi_index(tuple(parents_instances.T), parents_shape)
+                self.conditionals[child] = ConditionalSampler(distributions, parents_shape, instances_index)
+            domain_sizes[child] = max(distributions.shape[1], self.columns[child].distribution_probabilities.size)
+
+    def sample_binning_indices(self, attr, n):
+        """Sample binning indices from the distribution of an attribute in the attribute description."""
+        probabilities, aliases = self.marginals[attr]
+        return Series(sample_alias_tables(probabilities, aliases, np.zeros(n, dtype=np.int64)))
+
+    def sample_encoded_dataset(self, n):
+        """Sample binning indices of the attributes in the Bayesian network, in topological order.
+
+        Every child is drawn for all rows at once, from the conditional distribution of the parents instance of each
+        row. Rows whose parents instance has no conditional distribution are drawn from the distribution of the child
+        in the attribute description. Indices are kept in a column-contiguous array of the plan's dtype.
+        """
+        encoded = np.zeros((n, len(self.sampling_order)), dtype=self.dtype, order='F')
+        attr_to_idx = {attr: idx for idx, attr in enumerate(self.sampling_order)}
+        root = self.sampling_order[0]
+        encoded[:, 0] = self.conditionals[root].sample(np.zeros(n, dtype=np.int64))
+
+        for child, parents in self.bayesian_network:
+            sampler = self.conditionals[child]
+            rows = sampler.rows([encoded[:, attr_to_idx[parent]] for parent in parents])
+            conditioned = rows >= 0
+            values = encoded[:, attr_to_idx[child]]
+            values[conditioned] = sampler.sample(rows[conditioned])
+            probabilities, aliases = self.marginals[child]
+            values[~conditioned] = sample_alias_tables(probabilities, aliases, np.zeros(n - conditioned.sum(),
+                                                                                        dtype=np.int64))
+        return DataFrame(encoded, columns=self.sampling_order, copy=False)
+
+
+def parse_parents_instance(key: str):
+    """Parse a key of conditional_probabilities, such as "[0, 3]", into a list of binning indices."""
+    return [int(code) for code in key.strip('[]').split(',')]
+
+
+@lru_cache(maxsize=MAX_CACHED_PLANS)
+def compile_description_file(description_file, modification_time):
+    return SamplingPlan(read_json_file(description_file))
+
+
+def load_sampling_plan(description_file):
+    """Compile a description file into a SamplingPlan. Plans are cached by path and modification time, so they are
+    compiled again after the file changes.
+    """
+    description_file = os.path.abspath(description_file)
+    return compile_description_file(description_file, os.stat(description_file).st_mtime_ns)
@@ -0,0 +1,116 @@
+import os
+from io import BytesIO
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool
+from typing import Dict, List
+
+import numpy as np
+from pandas import read_csv
+
+from lib.PrivBayes import count_codes
+
+"""
+Map-reduce pass over byte-range shards of a CSV file. Contingency counts are additive across rows, so each worker
+process encodes its own shard with the bin definitions of the dataset description and counts partial tables, which
+are summed before any noise is injected. Shards are read into the attribute classes of their columns, which apply the
+same preprocessing as when the whole dataset is described, e.g. parsing SocialSecurityNumber strings into numbers.
+"""
+
+
+def csv_byte_ranges(file_name, num_shards):
+    """Split the rows of a CSV file, after its header, into at most num_shards byte ranges starting at line starts.
+
+    Fields that contain line breaks are not supported.
+    """
+    size = os.path.getsize(file_name)
+    with open(file_name, 'rb') as file:
+        file.readline()
+        boundaries = [file.tell()]
+        for shard in range(1, num_shards):
+            offset = boundaries[0] + (size - boundaries[0]) * shard // num_shards
+            if offset < boundaries[-1]:
+                continue
+            file.seek(offset)
+            file.readline()
+            if boundaries[-1] < file.tell() < size:
+                boundaries.append(file.tell())
+        boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if start < end]
+
+
+def read_csv_shard(file_name, byte_range, names, **read_csv_kwargs):
+    """Read the rows of a CSV file within a byte range returned by csv_byte_ranges."""
+    start, end = byte_range
+    with open(file_name, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return read_csv(BytesIO(data), header=None, names=names, **read_csv_kwargs)
+
+
+def count_shard(paras):
+    """Worker of count_tables_in_shards. Return (number of rows, {table: counts}, {attribute: largest bin index})."""
+    file_name, byte_range, names, read_csv_kwargs, bin_definitions, tables = paras
+    df_shard = read_csv_shard(file_name, byte_range, names, **read_csv_kwargs)
+    codes = {}
+    for attr, (attribute_class, is_categorical, bins) in bin_definitions.items():
+        column = attribute_class(attr, False, is_categorical, len(bins), df_shard[attr])
+        column.distribution_bins = bins
+        codes[attr] = column.encode_values_into_bin_idx().values
+    # One axis per attribute, wide enough for every bin and for missing values.
+    shape = {attr: len(bins) + 1 for attr, (_, _, bins) in bin_definitions.items()}
+    counts = {table: count_codes([codes[attr] for attr in table], [shape[attr] for attr in table])
+              for table in tables}
+    max_codes = {attr: int(column.max()) if column.size else -1 for attr, column in codes.items()}
+    return df_shard.shape[0], counts, max_codes
+
+
+def count_tables_in_shards(file_name, tables: List[tuple], bin_definitions: Dict[str, tuple], num_shards=None,
+                           processes=None, **read_csv_kwargs):
+    """Count contingency tables of an encoded CSV file, in worker processes that each read one shard of it.
+
+    Parameters
+    ----------
+    file_name : str
+        CSV file with a header line.
+    tables : list of tuple
+        Attributes of each contingency table.
+    bin_definitions : dict
+        Dictionary of {attribute: (AbstractAttribute subclass, is_categorical, distribution_bins)}, as in the dataset
+        description.
+    num_shards : int
+        Defaults to the number of processes.
+    processes : int
+        Number of worker processes. Defaults to os.cpu_count().
+    read_csv_kwargs
+        Passed to pandas.read_csv for every shard.
+
+    Returns
+    -------
+    (int, dict)
+        Number of rows, and {table: summed counts}. Like counts of the whole encoded dataset, every axis is as long as
+        the largest bin index of its attribute + 1.
+    """
+    processes = processes or cpu_count()
+    with open(file_name, 'rb') as file:
+        header = read_csv(BytesIO(file.readline()), **read_csv_kwargs)
+    names = list(header.columns)
+    byte_ranges = csv_byte_ranges(file_name, num_shards or processes)
+    tasks = [(file_name, byte_range, names, read_csv_kwargs, bin_definitions, tables) for byte_range in byte_ranges]
+
+    num_tuples = 0
+    counts = {}
+    max_codes = {attr: -1 for attr in bin_definitions}
+    with Pool(min(processes, len(tasks))) as pool:
+        for shard_tuples, shard_counts, shard_max_codes in pool.imap_unordered(count_shard, tasks):
+            num_tuples += shard_tuples
+            for table, table_counts in shard_counts.items():
+                if table in counts:
+                    counts[table] += table_counts
+                else:
+                    counts[table] = table_counts
+            for attr, max_code in shard_max_codes.items():
+                max_codes[attr] = max(max_codes[attr], max_code)
+
+    for table in tables:
+        counts[table] = counts[table][tuple(np.s_[:max_codes[attr] + 1] for attr in table)]
+    return num_tuples, counts
@@ -3,8 +3,8 @@ import random
 from string import ascii_lowercase
 
 import numpy as np
-from pandas import Series, DataFrame
-from sklearn.metrics import mutual_info_score, normalized_mutual_info_score
+from pandas import Series, DataFrame, factorize
+from sklearn.metrics import normalized_mutual_info_score
 
 
 def set_random_seed(seed=0):
@@ -20,12 +20,136 @@ def mutual_information(labels_x: Series, labels_y: DataFrame):
     labels_x : Series
     labels_y : DataFrame
     """
-    if labels_y.shape[1] == 1:
-        labels_y = labels_y.iloc[:, 0]
-    else:
-        labels_y = labels_y.apply(lambda x: ' '.join(x.get_values()), axis=1)
+    codes_x, cardinality_x = factorize_into_codes(labels_x)
+    columns_y, cardinalities_y = zip(*[factorize_into_codes(labels_y[attr]) for attr in labels_y])
+    return mutual_information_from_codes(codes_x, cardinality_x, columns_y, cardinalities_y)
+
+
+def factorize_into_codes(labels: Series):
+    """Encode labels into integer codes. Missing values share one extra code."""
+    codes, uniques = factorize(labels)
+    codes = codes.astype(np.int64, copy=False)
+    cardinality = uniques.size
+    missing = codes < 0
+    if missing.any():
+        codes[missing] = cardinality
+        cardinality += 1
+    return codes, max(cardinality, 1)
+
+
+def compact_unsigned_dtype(max_code):
+    """The smallest unsigned integer dtype that holds the codes 0, ..., max_code."""
+    return np.min_scalar_type(max(int(max_code), 0))
+
+
+def encoded_dataset_to_codes(encoded_dataset: DataFrame):
+    """Column-contiguous array of an encoded dataset, in the smallest dtype that holds every column.
+
+    Return (codes, cardinalities), where cardinalities are int64 so that adding to them never overflows.
+    """
+    codes = np.asfortranarray(encoded_dataset.values, dtype=np.result_type(*encoded_dataset.dtypes))
+    cardinalities = codes.max(axis=0).astype(np.int64) + 1
+    return codes, cardinalities
+
+
+def combine_codes(columns, cardinalities):
+    """Fold columns of integer codes into one mixed-radix code per row.
+
+    Parameters
+    ----------
+    columns : list of ndarray
+        1-D arrays of non-negative integer codes, one per attribute.
+    cardinalities : list of int
+        Number of distinct codes of each column.
+
+    Return
+    --------
+    (ndarray, int)
+        Combined codes and the size of their domain. Whenever the mixed-radix domain outgrows the number of rows,
+        the combined codes are relabelled densely, so counting them never needs more bins than there are rows.
+    """
+    num_rows = len(columns[0])
+    combined = np.zeros(num_rows, dtype=np.int64)
+    domain_size = 1
+    for column, cardinality in zip(columns, cardinalities):
+        if domain_size > num_rows:
+            combined, domain_size = relabel_codes(combined)
+        combined *= int(cardinality)
+        combined += column
+        domain_size *= int(cardinality)
+    if domain_size > max(num_rows, 1):
+        combined, domain_size = relabel_codes(combined)
+    return combined, domain_size
+
+
+def relabel_codes(codes: np.ndarray):
+    """Map integer codes onto range(number of distinct codes)."""
+    uniques, relabelled = np.unique(codes, return_inverse=True)
+    return relabelled.astype(np.int64, copy=False).ravel(), max(uniques.size, 1)
 
-    return mutual_info_score(labels_x, labels_y)
+
+def entropy_from_counts(counts: np.ndarray):
+    """Shannon entropy (in nats) of the distribution given by an array of counts."""
+    counts = counts[counts > 0]
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+    probabilities = counts / total
+    return float(-np.dot(probabilities, np.log(probabilities)))
+
+
+def entropy_of_codes(columns, cardinalities):
+    """Joint entropy (in nats) of integer-coded attributes, counted by np.bincount over their mixed-radix code."""
+    combined, domain_size = combine_codes(columns, cardinalities)
+    return entropy_from_counts(np.bincount(combined, minlength=domain_size))
+
+
+def mutual_information_from_codes(codes_x: np.ndarray, cardinality_x: int, columns_y, cardinalities_y):
+    """Mutual information (in nats) between integer-coded attributes.
+
+    Equivalent to sklearn's mutual_info_score. Parent columns are folded into one mixed-radix code and the
+    contingency table is counted by np.bincount, so no label is built per row.
+
+    Parameters
+    ----------
+    codes_x : ndarray
+        1-D array of integer codes in range(cardinality_x).
+    cardinality_x : int
+    columns_y : list of ndarray
+        1-D arrays of integer codes, one per attribute.
+    cardinalities_y : list of int
+    """
+    codes_y, cardinality_y = combine_codes(columns_y, cardinalities_y)
+    joint, joint_size = combine_codes([codes_y, codes_x], [cardinality_y, cardinality_x])
+    entropy_x = entropy_from_counts(np.bincount(codes_x, minlength=cardinality_x))
+    entropy_y = entropy_from_counts(np.bincount(codes_y, minlength=cardinality_y))
+    entropy_xy = entropy_from_counts(np.bincount(joint, minlength=joint_size))
+    return max(entropy_x + entropy_y - entropy_xy, 0.0)
+
+
+def stratified_sample_indices(strata: np.ndarray, sample_size: int):
+    """Sample row indices without replacement, proportionally to the size of each stratum.
+
+    Quotas are rounded up, so every non-empty stratum keeps at least one row and the sample holds at least sample_size
+    rows.
+
+    Parameters
+    ----------
+    strata : ndarray
+        1-D array of non-negative integer stratum codes, one per row.
+    sample_size : int
+        Target number of sampled rows.
+    """
+    num_rows = strata.size
+    if sample_size >= num_rows:
+        return np.arange(num_rows)
+    counts = np.bincount(strata)
+    quotas = np.ceil(counts * sample_size / num_rows).astype(np.int64)
+    shuffled = np.random.permutation(num_rows)
+    grouped = shuffled[np.argsort(strata[shuffled], kind='stable')]
+    starts = np.cumsum(counts) - counts
+    rank_in_stratum = np.arange(num_rows) - np.repeat(starts, counts)
+    return np.sort(grouped[rank_in_stratum < np.repeat(quotas, counts)])
 
 
 def pairwise_attributes_mutual_information(dataset):
@@ -50,6 +174,14 @@ def normalize_given_distribution(frequencies):
         return np.full_like(distribution, 1 / distribution.size)
 
 
+def normalize_conditional_distributions(frequencies):
+    """Normalize a table of frequencies along its last axis, like normalize_given_distribution on every row."""
+    distributions = np.array(frequencies, dtype=float).clip(0)
+    summations = distributions.sum(axis=-1, keepdims=True)
+    uniform = np.full_like(distributions, 1 / distributions.shape[-1])
+    return np.divide(distributions, summations, out=uniform, where=summations > 0)
+
+
 def read_json_file(json_file):
     with open(json_file, 'r') as file:
         return json.load(file)
@@ -76,5 +208,51 @@ def display_bayesian_network(bn):
         print("    {0:{width}} has parents {1}.".format(child, parents, width=length))
 
 
-def generate_random_string(length):
-    return ''.join(np.random.choice(list(ascii_lowercase), size=length))
+def generate_random_strings(lengths):
+    """Generate random lowercase strings of the given lengths in bulk.
+
+    The characters of all strings are drawn at once into an (n, max length) byte array, where bytes beyond the length
+    of each row are zero. Viewed as fixed width byte strings, rows lose these trailing zero bytes.
+    """
+    lengths = np.maximum(np.asarray(lengths, dtype=np.int64), 0)
+    width = max(int(lengths.max(initial=0)), 1)
+    characters = np.random.randint(len(ascii_lowercase), size=(lengths.size, width), dtype=np.uint8)
+    characters += ord(ascii_lowercase[0])
+    characters[np.arange(width) >= lengths[:, np.newaxis]] = 0
+    return characters.view(f'S{width}').ravel().astype(str)
+
+
+# Number of keys permuted at a time by permute_key_space, to bound the memory of intermediate arrays.
+KEY_CHUNK_SIZE = 1 << 22
+
+
+def permute_key_space(n, size, num_rounds=4):
+    """Draw n distinct integers from [0, size), as the images of 0, ..., n - 1 under a random bijection of [0, size).
+
+    The bijection is a balanced Feistel network over the smallest even number of bits that covers size, with round keys
+    drawn from np.random. Images that fall outside [0, size) are encrypted again until they fall inside (cycle walking),
+    which restricts the network to a bijection of [0, size). Uniqueness therefore needs no set of the drawn keys.
+    """
+    if n > size:
+        raise Exception(f'Cannot draw {n} distinct keys from {size} values.')
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = np.uint64((1 << half_bits) - 1)
+    round_keys = np.random.randint(0, 2 ** 32, size=num_rounds, dtype=np.uint64)
+    multiplier = np.uint64(0x9E3779B97F4A7C15)
+
+    def encrypt(values):
+        left, right = values >> np.uint64(half_bits), values & mask
+        for key in round_keys:
+            # uint64 products wrap around, which makes a cheap hash of the right half.
+            left, right = right, left ^ ((((right ^ key) * multiplier) >> np.uint64(32)) & mask)
+        return (left << np.uint64(half_bits)) | right
+
+    keys = np.empty(n, dtype=np.int64)
+    for start in range(0, n, KEY_CHUNK_SIZE):
+        chunk = encrypt(np.arange(start, min(start + KEY_CHUNK_SIZE, n), dtype=np.uint64))
+        outside = np.flatnonzero(chunk >= size)
+        while outside.size:
+            chunk[outside] = encrypt(chunk[outside])
+            outside = outside[chunk[outside] >= size]
+        keys[start:start + chunk.size] = chunk
+    return keys